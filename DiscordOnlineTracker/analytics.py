@@ -0,0 +1,260 @@
+import logging
+import os
+import warnings
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+    numpy_available = True
+except ImportError:
+    np = None
+    numpy_available = False
+
+logger = logging.getLogger(__name__)
+
+OFFLINE = "offline"
+ONLINE_STATUSES = (b"online", b"idle", b"dnd", b"invisible")
+SHADES = " ░▒▓█"
+
+def parse_lines(data):
+    """Slow path for a damaged day file - parse line by line, skipping bad lines"""
+    rows = []
+    for line in data.splitlines():
+        try:
+            timestamp, member_id, old_status, new_status = line.split()
+            rows.append((float(timestamp), int(member_id), old_status != OFFLINE.encode(), new_status != OFFLINE.encode()))
+        except ValueError:
+            continue  # Partially written line
+    if not rows:
+        return None
+    timestamps, member_ids, old_online, new_online = zip(*rows)
+    return (np.array(timestamps), np.array(member_ids, dtype=np.int64),
+            np.array(old_online, dtype=bool), np.array(new_online, dtype=bool))
+
+def read_day_file(path):
+    """Parse one journal day file into (timestamps, member_ids, old_online, new_online) arrays.
+    
+    Statuses become 0/1 and the fixed 3-decimal timestamps are split at the
+    point, so the whole file parses as integers in one numpy call (member ids
+    do not fit a float64).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    # A partially written last line is ignored
+    data = data[:data.rfind(b"\n") + 1]
+    lines = data.count(b"\n")
+    if not lines:
+        return None
+    
+    numeric = data.replace(OFFLINE.encode(), b"0")
+    for status in ONLINE_STATUSES:
+        numeric = numeric.replace(status, b"1")
+    try:
+        with warnings.catch_warnings():
+            # Older numpy warns (instead of raising) on text it cannot parse
+            warnings.simplefilter("error", DeprecationWarning)
+            values = np.fromstring(numeric.replace(b".", b" "), dtype=np.int64, sep=" ")
+    except (ValueError, DeprecationWarning):
+        values = None
+    if values is None or len(values) != lines * 5:
+        # Damaged line in the middle of the file
+        return parse_lines(data)
+    
+    values = values.reshape(-1, 5)
+    timestamps = values[:, 0] + values[:, 1] / 1000
+    return timestamps, values[:, 2], values[:, 3] == 1, values[:, 4] == 1
+
+def load_transitions(journal, start, end):
+    """Load journal transitions between two datetimes as arrays, in file order"""
+    start_ts = start.timestamp()
+    end_ts = end.timestamp()
+    
+    parts = []
+    day = start.date()
+    while day <= end.date():
+        path = journal.file_for_day(day)
+        day += timedelta(days=1)
+        if not os.path.exists(path):
+            continue
+        try:
+            part = read_day_file(path)
+        except Exception as e:
+            logger.error(f"❌ Error reading presence journal {path}: {e}")
+            continue
+        if part:
+            parts.append(part)
+    
+    if not parts:
+        empty = np.zeros(0)
+        return empty, empty.astype(np.int64), empty.astype(bool), empty.astype(bool)
+    
+    timestamps, member_ids, old_online, new_online = (np.concatenate(column) for column in zip(*parts))
+    keep = (timestamps >= start_ts) & (timestamps <= end_ts)
+    return timestamps[keep], member_ids[keep], old_online[keep], new_online[keep]
+
+def load_hourly_activity(journal, member_ids, start, days, elapsed_hours=None):
+    """Fold the presence journal into hour-of-day activity, without a members x hours matrix.
+    
+    Returns (seen_ids, profiles, online_per_hour):
+        seen_ids        - members with any online time in the window (row order of profiles)
+        profiles        - seen members x 24, days each member was online in that hour of day
+        online_per_hour - number of members online in each hour of the window
+    
+    An hour counts as online if the member was online for any part of it.
+    Only the first `elapsed_hours` hours are counted (hours that have happened).
+    """
+    hours = days * 24
+    limit = hours if elapsed_hours is None else max(0, min(hours, elapsed_hours))
+    start_ts = start.timestamp()
+    end_ts = start_ts + limit * 3600
+    
+    timestamps, members, old_online, new_online = load_transitions(journal, start, start + timedelta(days=days))
+    wanted = np.isin(members, np.fromiter(member_ids, dtype=np.int64))
+    timestamps, members = timestamps[wanted], members[wanted]
+    old_online, new_online = old_online[wanted], new_online[wanted]
+    
+    # Group transitions by member, in time order
+    order = np.lexsort((timestamps, members))
+    timestamps, members = timestamps[order], members[order]
+    old_online, new_online = old_online[order], new_online[order]
+    
+    first = np.ones(len(members), dtype=bool)
+    first[1:] = members[1:] != members[:-1]
+    last = np.ones(len(members), dtype=bool)
+    last[:-1] = first[1:]
+    
+    # Online before each transition: the previous transition's new status, or for a
+    # member's first transition its old status (online when the window opened)
+    was_online = np.empty(len(members), dtype=bool)
+    was_online[1:] = new_online[:-1]
+    was_online[first] = old_online[first]
+    
+    # Sessions open and close in alternation per member, so the k-th open pairs with the k-th close
+    opens = (first & old_online) | (new_online & ~was_online)
+    open_times = np.where(first & old_online, start_ts, timestamps)[opens]
+    closes = (was_online & ~new_online) | (last & new_online)
+    close_times = np.where(last & new_online, end_ts, timestamps)[closes]
+    session_members = members[opens]
+    
+    # Hour ranges [first, last) per session
+    firsts = np.maximum(0, (open_times - start_ts) // 3600).astype(np.int64)
+    lasts = np.minimum(limit, np.maximum(firsts + 1, np.ceil((close_times - start_ts) / 3600))).astype(np.int64)
+    counted = firsts < lasts
+    firsts, lasts, session_members = firsts[counted], lasts[counted], session_members[counted]
+    
+    # Merge a member's sessions that share an hour so it is never counted twice
+    # (lasts never decrease within a member, so the previous range's end is enough)
+    new_range = np.ones(len(firsts), dtype=bool)
+    new_range[1:] = (session_members[1:] != session_members[:-1]) | (firsts[1:] >= lasts[:-1])
+    range_starts = np.flatnonzero(new_range)
+    firsts = firsts[range_starts]
+    lasts = np.maximum.reduceat(lasts, range_starts) if len(range_starts) else lasts
+    seen, rows = np.unique(session_members[range_starts], return_inverse=True)
+    seen_ids = seen.tolist()
+    
+    profiles = np.zeros((len(seen_ids), 24), dtype=np.int32)
+    online_per_hour = np.zeros(hours, dtype=np.int32)
+    if not len(firsts):
+        return seen_ids, profiles, online_per_hour
+    
+    # Guild-wide online count per hour: +1/-1 difference array over the window
+    diff = np.zeros(hours + 1, dtype=np.int32)
+    np.add.at(diff, firsts, 1)
+    np.add.at(diff, lasts, -1)
+    online_per_hour[:] = np.cumsum(diff[:hours], dtype=np.int32)
+    
+    # Per-member hour-of-day profile: whole days cover every hour once,
+    # the remainder covers a run of up to 23 hours starting at first % 24
+    lengths = lasts - firsts
+    np.add.at(profiles, rows, (lengths // 24)[:, None].astype(np.int32))
+    run_starts = firsts % 24
+    run_diff = np.zeros((len(seen_ids), 49), dtype=np.int32)
+    np.add.at(run_diff, (rows, run_starts), 1)
+    np.add.at(run_diff, (rows, run_starts + lengths % 24), -1)
+    runs = np.cumsum(run_diff[:, :48], axis=1, dtype=np.int32)
+    profiles += runs[:, :24] + runs[:, 24:]
+    return seen_ids, profiles, online_per_hour
+
+def guild_heatmap(online_per_hour, start):
+    """Average number of tracked members online per weekday (0=Monday) x hour of day"""
+    days = len(online_per_hour) // 24
+    online_per_hour = online_per_hour.reshape(days, 24)
+    weekdays = (start.weekday() + np.arange(days)) % 7
+    
+    totals = np.zeros((7, 24))
+    np.add.at(totals, weekdays, online_per_hour)
+    day_counts = np.bincount(weekdays, minlength=7).reshape(7, 1)
+    return np.divide(totals, day_counts, out=np.zeros_like(totals), where=day_counts > 0)
+
+def role_peak_hours(profiles, role_rows, top=3):
+    """Busiest hours of day per role - {role_id: [hour, ...]}"""
+    peaks = {}
+    for role_id, rows in role_rows.items():
+        if len(rows) == 0:
+            continue
+        role_profile = profiles[rows].sum(axis=0)
+        if not role_profile.any():
+            continue
+        peaks[role_id] = [int(hour) for hour in np.argsort(role_profile)[::-1][:top]]
+    return peaks
+
+def usual_play_windows(profiles, width=3):
+    """Each member's busiest `width`-hour window (wrapping past midnight).
+    
+    Returns (start_hours, share) arrays, where share is the fraction of the
+    member's online hours that fall inside the window (0 if never online).
+    """
+    extended = np.concatenate([profiles, profiles[:, :width - 1]], axis=1)
+    cumulative = np.concatenate([np.zeros((profiles.shape[0], 1)), np.cumsum(extended, axis=1)], axis=1)
+    window_sums = cumulative[:, width:width + 24] - cumulative[:, :24]
+    
+    start_hours = window_sums.argmax(axis=1)
+    totals = profiles.sum(axis=1)
+    best = window_sums[np.arange(profiles.shape[0]), start_hours]
+    share = np.divide(best, totals, out=np.zeros(profiles.shape[0]), where=totals > 0)
+    return start_hours, share
+
+def build_activity_report(journal, tracked_members, days=30, now=None):
+    """Compute the heatmap, per-role peaks and play windows for tracked members.
+    
+    tracked_members is {member_id: role_id}. The window covers the last
+    `days` full days plus today. Memory grows with the members actually
+    seen online, not with the roster.
+    """
+    now = now or datetime.now()
+    start = datetime.combine(now.date() - timedelta(days=days), datetime.min.time())
+    total_days = days + 1
+    
+    # Only count hours that have already happened
+    elapsed_hours = int((now - start).total_seconds() // 3600) + 1
+    seen_ids, profiles, online_per_hour = load_hourly_activity(
+        journal, tracked_members, start, total_days, elapsed_hours
+    )
+    
+    role_rows = {}
+    for row, member_id in enumerate(seen_ids):
+        role_rows.setdefault(tracked_members[member_id], []).append(row)
+    role_rows = {role_id: np.asarray(rows) for role_id, rows in role_rows.items()}
+    
+    window_starts, window_shares = usual_play_windows(profiles)
+    
+    return {
+        "start": start,
+        "days": total_days,
+        "members": len(tracked_members),
+        "active_members": len(seen_ids),
+        "heatmap": guild_heatmap(online_per_hour, start),
+        "role_peaks": role_peak_hours(profiles, role_rows),
+        "windows": {
+            member_id: (int(window_starts[row]), float(window_shares[row]))
+            for row, member_id in enumerate(seen_ids)
+        },
+    }
+
+def render_heat_row(values):
+    """Render one row of values as shaded blocks scaled to the row maximum"""
+    peak = values.max()
+    if peak <= 0:
+        return SHADES[0] * len(values)
+    levels = np.ceil(values / peak * (len(SHADES) - 1)).astype(int)
+    return "".join(SHADES[level] for level in levels)
@@ -0,0 +1,283 @@
+"""
+bench_online_announce.py - Offline scaling benchmark for OnlineAnnounce
+
+Builds a synthetic guild (members, roles, attendance channel) and drives
+start_tracking, the presence_check reconciliation pass and presence
+updates through the dispatch filter. Nothing talks to Discord:
+channel.send is a stub that only counts calls.
+
+    python benchmarks/bench_online_announce.py --sizes 1000 10000 100000
+    python benchmarks/bench_online_announce.py --save-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+import discord
+
+import config
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Share of guild members holding each tracked role - the rest have none
+ROLE_DISTRIBUTION = [
+    (config.ROLES["IMPERIUS"], 0.25),
+    (config.ROLES["INACTIVE"], 0.06),
+    (config.ROLES["OG"], 0.04),
+    (config.ROLES["CUTE"], 0.01),
+    (config.ROLES["QUEEN"], 0.0005),
+    (config.ROLES["CLAN_MASTER"], 0.0005),
+]
+ONLINE_SHARE = 0.3
+
+# ======== FAKE DISCORD OBJECTS ========
+
+class FakeRole:
+    def __init__(self, role_id, guild):
+        self.id = role_id
+        self.guild = guild
+        self.name = str(role_id)
+
+    @property
+    def members(self):
+        # Same cost profile as discord.py: a scan over the guild member cache
+        return [member for member in self.guild.members if self in member.roles]
+
+class FakeAvatar:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+class FakeMember:
+    __slots__ = ("id", "guild", "roles", "status", "bot", "name", "display_name", "mention", "display_avatar")
+
+    def __init__(self, member_id, guild, roles, status):
+        self.id = member_id
+        self.guild = guild
+        self.roles = roles
+        self.status = status
+        self.bot = False
+        self.name = f"member{member_id}"
+        self.display_name = self.name
+        self.mention = f"<@{member_id}>"
+        self.display_avatar = FakeAvatar
+
+    def with_status(self, status):
+        """Copy of this member with another status (a before/after presence pair)"""
+        return FakeMember(self.id, self.guild, self.roles, status)
+
+class FakeMessage:
+    def __init__(self, channel, message_id):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, **kwargs):
+        self.channel.edits += 1
+
+    async def pin(self, **kwargs):
+        pass
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.sends = 0
+        self.edits = 0
+
+    async def send(self, *args, **kwargs):
+        self.sends += 1
+        return FakeMessage(self, self.sends)
+
+    async def fetch_message(self, message_id):
+        return FakeMessage(self, message_id)
+
+class FakeGuild:
+    def __init__(self, guild_id=1):
+        self.id = guild_id
+        self.members = []
+        self.roles = {}
+        self.channels = {}
+        self._members_by_id = {}
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_member(self, member_id):
+        return self._members_by_id.get(member_id)
+
+class FakeBot:
+    def __init__(self):
+        # Never set - keeps the background loops parked in before_loop
+        self.ready = asyncio.Event()
+
+    async def wait_until_ready(self):
+        await self.ready.wait()
+
+def build_guild(size, rng):
+    """Create a guild with `size` members and the configured role distribution"""
+    guild = FakeGuild()
+    for role_id, share in ROLE_DISTRIBUTION:
+        guild.roles[role_id] = FakeRole(role_id, guild)
+
+    for index in range(size):
+        roles = []
+        roll = rng.random()
+        for role_id, share in ROLE_DISTRIBUTION:
+            if roll < share:
+                roles.append(guild.roles[role_id])
+                break
+            roll -= share
+
+        status = discord.Status.online if rng.random() < ONLINE_SHARE else discord.Status.offline
+        member = FakeMember(100000000000000000 + index, guild, roles, status)
+        guild.members.append(member)
+        guild._members_by_id[member.id] = member
+
+    return guild
+
+def presence_stream(guild, count, rng):
+    """Generate (before, after) pairs - mostly activity-only updates, like a real gateway"""
+    statuses = [discord.Status.online, discord.Status.idle, discord.Status.dnd, discord.Status.offline]
+    for _ in range(count):
+        member = rng.choice(guild.members)
+        before = member.with_status(member.status)
+        if rng.random() < 0.7:
+            # Game/Spotify/activity change - status unchanged
+            yield before, member
+            continue
+        member.status = rng.choice([status for status in statuses if status != member.status])
+        yield before, member
+
+# ======== BENCHMARK ========
+
+async def run_size(size, events, seed):
+    """Benchmark one guild size and return its results - journal and state live in a temp dir"""
+    with tempfile.TemporaryDirectory(prefix="bench_online_announce_") as workdir:
+        return await measure(size, events, seed, workdir)
+
+async def measure(size, events, seed, workdir):
+    """Build the guild, drive OnlineAnnounce and collect the metrics"""
+    from online_announce import OnlineAnnounce
+    from state_manager import StateManager
+
+    rng = random.Random(seed)
+    config.PRESENCE_JOURNAL_DIR = os.path.join(workdir, "presence_journal")
+    config.ANNOUNCE_COALESCE_SECONDS = 0
+
+    guild = build_guild(size, rng)
+    channel = FakeChannel(config.CHANNELS["ATTENDANCE"])
+    guild.channels[channel.id] = channel
+    state = StateManager(os.path.join(workdir, "state_data.json"))
+
+    tracemalloc.start()
+    announce = OnlineAnnounce(FakeBot(), guild, state)
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    announce.start_tracking()
+    start_tracking_wall = time.perf_counter() - started
+    start_tracking_cpu = time.process_time() - cpu_started
+
+    # Presence stream through the dispatch filter, as ImperialBot.dispatch does
+    stream = list(presence_stream(guild, events, rng))
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for before, after in stream:
+        if announce.accept_presence(before, after):
+            await announce.on_presence_update(before, after)
+    while announce.presence_queue.pending or announce.status_checks:
+        await asyncio.sleep(0)  # Let the presence workers drain the queue
+    events_wall = time.perf_counter() - started
+    events_cpu = time.process_time() - cpu_started
+
+    # Reconciliation ticks
+    ticks = 5
+    cpu_started = time.process_time()
+    for _ in range(ticks):
+        await announce.presence_check()
+    tick_cpu = (time.process_time() - cpu_started) / ticks
+
+    for send_queue in announce.send_queues.values():
+        if send_queue.flush_task:
+            await send_queue.flush_task
+
+    current_memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    for loop in (announce.presence_check, announce.flush_online_time, announce.update_board, announce.post_attendance_digest):
+        loop.cancel()
+    for worker in announce.presence_workers:
+        worker.cancel()
+
+    return {
+        "members": size,
+        "tracked": len(announce.tracked_members),
+        "events": events,
+        "start_tracking_ms": round(start_tracking_wall * 1000, 2),
+        "start_tracking_cpu_ms": round(start_tracking_cpu * 1000, 2),
+        "events_per_second": round(events / events_wall) if events_wall else None,
+        "event_cpu_us": round(events_cpu / events * 1e6, 2),
+        "tick_cpu_ms": round(tick_cpu * 1000, 3),
+        "peak_memory_mb": round(peak_memory / 1024 / 1024, 2),
+        "sends": channel.sends,
+        "accepted_events": announce.presence_filter_stats["accepted"],
+        "merged_events": announce.presence_queue.stats["merged"],
+    }
+
+def compare(results, baseline):
+    """Print each metric next to the stored baseline"""
+    lower_is_better = ("start_tracking_ms", "start_tracking_cpu_ms", "event_cpu_us", "tick_cpu_ms", "peak_memory_mb")
+    for result in results:
+        base = baseline.get(str(result["members"]))
+        if not base:
+            print(f"  {result['members']:>7} members: no baseline")
+            continue
+        print(f"  {result['members']:>7} members:")
+        for metric in lower_is_better + ("events_per_second",):
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            better = change < 0 if metric in lower_is_better else change > 0
+            marker = "✅" if better or abs(change) < 5 else "⚠️"
+            print(f"    {marker} {metric:<22} {old:>12} -> {new:<12} ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline OnlineAnnounce scaling benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--events", type=int, default=50000, help="Presence updates per size")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    args = parser.parse_args()
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+
+    results = []
+    for size in args.sizes:
+        result = asyncio.run(run_size(size, args.events, args.seed))
+        results.append(result)
+        print(json.dumps(result))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({str(result["members"]): result for result in results}, f, indent=2)
+        print(f"💾 Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        print("📊 Compared with baseline:")
+        compare(results, baseline)
+
+if __name__ == "__main__":
+    main()
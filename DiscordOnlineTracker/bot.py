@@ -385,18 +385,27 @@ async def check_specific_member(ctx, member: discord.Member = None):
     check_since = datetime.now() - timedelta(days=15)
     
     if hasattr(cleanup_system, 'was_member_active_since'):
+        if hasattr(cleanup_system, 'ensure_attendance_history') and not cleanup_system.state.is_attendance_backfilled():
+            await ctx.send("⏳ Loading attendance history - this can take a while the first time...")
+            if not await cleanup_system.ensure_attendance_history(attendance_channel):
+                await ctx.send("❌ Attendance history is still loading - try again later")
+                return
+        
         was_active = await cleanup_system.was_member_active_since(member, attendance_channel, check_since)
         
+        last_seen = await cleanup_system.get_last_activity_date(member, attendance_channel)
+        last_seen_line = f"🟢 Last online: {last_seen.strftime('%Y-%m-%d %H:%M')}" if last_seen else "🟢 Never seen online"
+        
         if was_active:
-            await ctx.send(f"✅ {member.mention} has been active in the last 15 days")
+            await ctx.send(f"✅ {member.mention} has been active in the last 15 days\n{last_seen_line}")
         else:
             # Check last check date
             last_check = cleanup_system.member_last_check.get(member.id) if hasattr(cleanup_system, 'member_last_check') else None
             if last_check:
                 days_ago = (datetime.now() - last_check).days
-                await ctx.send(f"⚠️ {member.mention} appears INACTIVE for 15+ days\n📅 Last checked: {last_check.strftime('%Y-%m-%d')} ({days_ago} days ago)")
+                await ctx.send(f"⚠️ {member.mention} appears INACTIVE for 15+ days\n{last_seen_line}\n📅 Last checked: {last_check.strftime('%Y-%m-%d')} ({days_ago} days ago)")
             else:
-                await ctx.send(f"⚠️ {member.mention} appears INACTIVE for 15+ days\n📅 Never checked before")
+                await ctx.send(f"⚠️ {member.mention} appears INACTIVE for 15+ days\n{last_seen_line}\n📅 Never checked before")
     else:
         await ctx.send("❌ Cleanup system doesn't support activity checking")
 
@@ -570,7 +579,7 @@ async def on_member_join(member):
 @bot.event
 async def on_member_remove(member):
     """Handle member leaving/kicked"""
-    global recruitment, cleanup_system
+    global recruitment, cleanup_system, online_announce
     
     try:
         logger.info(f"👋 Member left: {member.name} (ID: {member.id})")
@@ -590,10 +599,35 @@ async def on_member_remove(member):
             if member.id in cleanup_system.member_grace_period:
                 del cleanup_system.member_grace_period[member.id]
                 logger.info(f"Removed {member.name} from grace period tracking")
+        
+        # Stop tracking the member for online announcements
+        if online_announce and hasattr(online_announce, 'on_member_remove'):
+            online_announce.on_member_remove(member)
             
     except Exception as e:
         logger.error(f"❌ Error in on_member_remove: {e}")
 
+@bot.event
+async def on_member_update(before, after):
+    """Handle member updates (role changes)"""
+    global main_guild, online_announce, cleanup_system
+    
+    try:
+        # Skip if not in our main guild
+        if not main_guild or after.guild.id != main_guild.id:
+            return
+        
+        # Keep the online announcement role index current
+        if online_announce and hasattr(online_announce, 'on_member_update'):
+            online_announce.on_member_update(before, after)
+        
+        # Keep the demotion index current
+        if cleanup_system and hasattr(cleanup_system, 'on_member_update'):
+            cleanup_system.on_member_update(before, after)
+            
+    except Exception as e:
+        logger.error(f"❌ Error in on_member_update: {e}")
+
 @bot.event
 async def on_presence_update(before, after):
     """Handle presence status changes (online/offline/idle/dnd)"""
@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 import logging
 import re
 
+import config
+
 logger = logging.getLogger(__name__)
 
 # ======== INACTIVE MEMBER VOTE VIEW ========
@@ -60,6 +62,10 @@ class InactiveMemberVoteView(discord.ui.View):
                     await member.remove_roles(imperius_role)
                     await member.add_roles(inactive_role)
                     
+                    cleanup_system = self.cleanup_system or getattr(interaction.client, 'cleanup_system', None)
+                    if cleanup_system:
+                        cleanup_system.record_demotion(member.id)
+                    
                     # Post to review channel for promotion/kick voting
                     review_channel = interaction.guild.get_channel(1454802873300025396)
                     if review_channel:
@@ -628,6 +634,10 @@ class CleanupSystem:
         
         # Track inactive role members to prevent immediate re-flagging
         self.inactive_role_checked = {}  # {member_id: last_check_date}
+        
+        # Attendance history is read into the state ledger once, then only new messages
+        self.history_sync_lock = asyncio.Lock()
+        self.announce_webhook_ids = None  # Webhook pool ids - None if they could not be listed
     
     def start_cleanup_task(self):
         """Start the cleanup task"""
@@ -728,6 +738,7 @@ class CleanupSystem:
             
             self.member_grace_period[member_id] = grace_until
             self.member_last_check[member_id] = now
+            self.state.clear_demotion_date(member_id)
             
             logger.info(f"✅ Promotion recorded for member {member_id}. Grace until: {grace_until.strftime('%Y-%m-%d')}")
             return True
@@ -735,6 +746,22 @@ class CleanupSystem:
             logger.error(f"❌ Error recording promotion: {e}")
             return False
     
+    def record_demotion(self, member_id, demoted_at=None):
+        """Record when a member got the Inactive role - the first record of a demotion wins"""
+        if self.state.get_demotion_date(member_id) is None:
+            self.state.set_demotion_date(member_id, demoted_at or datetime.now())
+            logger.info(f"📉 Demotion recorded for member {member_id}")
+    
+    def on_member_update(self, before, after):
+        """Keep the demotion index current from Inactive role changes"""
+        had_inactive = any(role.id == config.ROLES["INACTIVE"] for role in before.roles)
+        has_inactive = any(role.id == config.ROLES["INACTIVE"] for role in after.roles)
+        
+        if has_inactive and not had_inactive:
+            self.record_demotion(after.id)
+        elif had_inactive and not has_inactive:
+            self.state.clear_demotion_date(after.id)
+    
     async def check_inactive_members_15day_cycle(self):
         """Check for inactive Impèrius🔥 members - only checks each member every 15 days"""
         try:
@@ -759,6 +786,11 @@ class CleanupSystem:
             members_grace = 0
             members_flagged = 0
             
+            # Activity comes from the attendance ledger - history is only read until the one-time backfill completes
+            if not await self.ensure_attendance_history(attendance_channel):
+                logger.warning("⚠️ Attendance history backfill incomplete - skipping inactive check until it finishes")
+                return
+            
             # Check each Impèrius member
             for member in imperius_role.members:
                 if member.bot:
@@ -800,16 +832,9 @@ class CleanupSystem:
                 if should_check:
                     members_checked += 1
                     
-                    # Determine if member was active since last check date
-                    was_active = False
-                    
-                    if last_check_date:
-                        # Check attendance channel for activity since last check
-                        was_active = await self.was_member_active_since(member, attendance_channel, last_check_date)
-                    else:
-                        # First time checking - check last 15 days
-                        fifteen_days_ago = now - timedelta(days=15)
-                        was_active = await self.was_member_active_since(member, attendance_channel, fifteen_days_ago)
+                    # Determine if member was active since last check date (first check: last 15 days)
+                    since_date = last_check_date or now - timedelta(days=15)
+                    was_active = await self.was_member_active_since(member, attendance_channel, since_date)
                     
                     if not was_active:
                         # Member inactive since last check - flag for demotion
@@ -854,24 +879,95 @@ class CleanupSystem:
         except Exception as e:
             logger.error(f"❌ Error checking inactive members (15-day cycle): {e}")
     
-    async def was_member_active_since(self, member, attendance_channel, since_date):
-        """Check if member was active in attendance channel since given date"""
+    async def load_announce_webhooks(self, attendance_channel):
+        """Find the announcement webhook pool's ids, so other webhooks' posts don't count as attendance"""
         try:
-            # Increased limit from 100 to 1000 to prevent false flags
-            async for message in attendance_channel.history(limit=1000, after=since_date):
-                if message.author == self.bot.user and message.embeds:
-                    for embed in message.embeds:
-                        if embed.description and str(member.id) in embed.description:
-                            return True
-            return False
+            self.announce_webhook_ids = {
+                webhook.id for webhook in await attendance_channel.webhooks()
+                if webhook.name == config.ANNOUNCE_WEBHOOK_NAME
+            }
         except Exception as e:
-            logger.error(f"Error checking member activity: {e}")
-            return False  # Default to false to avoid accidental flags
+            # No Manage Webhooks permission - any webhook post counts rather than missing real arrivals
+            logger.warning(f"⚠️ Could not list attendance webhooks ({e}) - counting every webhook post")
+            self.announce_webhook_ids = None
+    
+    def is_attendance_message(self, message):
+        """Announcement posted by the bot itself or through its announcement webhook pool"""
+        if not message.embeds:
+            return False
+        if message.author == self.bot.user:
+            return True
+        return message.webhook_id is not None and (
+            self.announce_webhook_ids is None or message.webhook_id in self.announce_webhook_ids
+        )
+    
+    async def sync_attendance_history(self, attendance_channel):
+        """Read attendance messages newer than the saved cursor into the attendance ledger.
+        
+        Used once, to backfill arrivals announced before OnlineAnnounce wrote
+        the ledger itself. The cursor is saved after every page, so an
+        interrupted backfill resumes where it stopped. Returns False if the
+        history could not be read to the end.
+        """
+        async with self.history_sync_lock:
+            cursor = self.state.get_attendance_cursor()
+            after = discord.Object(id=cursor) if cursor else None
+            messages = 0
+            await self.load_announce_webhooks(attendance_channel)
+            
+            try:
+                async for message in attendance_channel.history(limit=None, after=after, oldest_first=True):
+                    messages += 1
+                    if self.is_attendance_message(message):
+                        seen_at = message.created_at.astimezone().replace(tzinfo=None)
+                        for embed in message.embeds:
+                            if embed.description:
+                                for member_id in re.findall(r"\d{15,20}", embed.description):
+                                    self.state.record_attendance(int(member_id), seen_at)
+                    
+                    if messages % 100 == 0:
+                        self.state.set_attendance_cursor(message.id)
+                    cursor = message.id
+                
+                if cursor:
+                    self.state.set_attendance_cursor(cursor)
+                self.state.set_attendance_backfilled()
+                
+                if messages:
+                    logger.info(f"📇 {'Backfilled' if after is None else 'Caught up on'} {messages} attendance messages")
+                return True
+                
+            except Exception as e:
+                logger.error(f"❌ Error reading attendance history ({messages} messages read): {e}")
+                return False
+    
+    async def ensure_attendance_history(self, attendance_channel):
+        """Make sure the ledger covers arrivals from before it existed - False if the backfill is incomplete"""
+        if self.state.is_attendance_backfilled():
+            return True
+        return await self.sync_attendance_history(attendance_channel)
+    
+    async def was_member_active_since(self, member, attendance_channel, since_date):
+        """Check if member came online since given date (attendance ledger - no API calls once backfilled).
+        
+        Counts the member as active while the history backfill is incomplete,
+        so nobody is reported inactive for lack of history.
+        """
+        if not await self.ensure_attendance_history(attendance_channel):
+            return True
+        last_seen = self.state.get_last_attendance(member.id)
+        return last_seen is not None and last_seen >= since_date
     
     async def find_demotion_date(self, member, review_channel):
-        """Try to find when member was demoted to Inactive role"""
+        """Get when member was demoted to Inactive role - from the demotion index"""
+        demoted_at = self.state.get_demotion_date(member.id)
+        if demoted_at:
+            return demoted_at
+        
+        # Demoted before the index existed - look it up once. If the post is not in
+        # the scanned window, the demotion is at least that old (but not before joining).
         try:
-            # Look for demotion messages in the last 60 days
+            demoted_at = None
             sixty_days_ago = datetime.now() - timedelta(days=60)
             
             async for message in review_channel.history(limit=200, after=sixty_days_ago):
@@ -881,8 +977,18 @@ class CleanupSystem:
                             # Check if it's a demotion message
                             title = embed.title or ""
                             if "Demoted" in title or "demoted" in embed.description.lower():
-                                return message.created_at.replace(tzinfo=None) if message.created_at.tzinfo else message.created_at
-            return None
+                                demoted_at = message.created_at.astimezone().replace(tzinfo=None)
+                                break
+                    if demoted_at:
+                        break
+            
+            if not demoted_at:
+                demoted_at = sixty_days_ago
+                if member.joined_at:
+                    joined_at = member.joined_at.replace(tzinfo=None) if member.joined_at.tzinfo else member.joined_at
+                    demoted_at = max(joined_at, sixty_days_ago)
+            self.state.set_demotion_date(member.id, demoted_at)
+            return demoted_at
         except:
             return None
     
@@ -1008,27 +1114,9 @@ class CleanupSystem:
             logger.error(f"❌ Error checking ghost/inactive users: {e}")
     
     async def get_last_activity_date(self, member, attendance_channel):
-        """Get the last date a member was announced online"""
-        try:
-            last_date = None
-            
-            async for message in attendance_channel.history(limit=500):
-                if message.author == self.bot.user and message.embeds:
-                    for embed in message.embeds:
-                        if embed.description and str(member.id) in embed.description:
-                            if message.created_at:
-                                msg_time = message.created_at.replace(tzinfo=None) if message.created_at.tzinfo else message.created_at
-                                if not last_date or msg_time > last_date:
-                                    last_date = msg_time
-                            break
-                if last_date:
-                    break
-            
-            return last_date
-            
-        except Exception as e:
-            logger.error(f"Error getting last activity: {e}")
-            return None
+        """Get the last date a member came online (attendance ledger - no API calls once backfilled)"""
+        await self.ensure_attendance_history(attendance_channel)
+        return self.state.get_last_attendance(member.id)
     
     async def is_user_already_posted_today(self, channel, user_id, post_type):
         """Check if user was already posted about today"""
@@ -40,3 +40,24 @@ INTERVIEW_TIMEOUT = 300  # 5 minutes in seconds
 GHOST_CHECK_HOURS = 24   # Check ghost users every 24 hours
 INACTIVE_CHECK_DAYS = 7  # Check inactive members every 7 days
 ONLINE_COOLDOWN = 1800   # 30 minutes in seconds
+OFFLINE_THRESHOLD = 300  # 5 minutes offline before a member can be announced again
+
+# Online Announce Settings
+ANNOUNCE_MODE = "stream"       # "stream" = one post per arrival, "board" = one pinned who's-online message,
+                               # "silent" = arrivals go to the local ledger and a periodic digest,
+                               # "daily" = announce each member at most once per calendar day
+ANNOUNCE_TIMEZONE = "UTC"      # Daily mode: IANA timezone whose midnight starts a new day
+ATTENDANCE_DIGEST_HOURS = 1    # Silent mode: 1 = hourly digest, 24 = daily digest
+BOARD_UPDATE_SECONDS = 60      # Board mode: at most one edit per interval
+ANNOUNCE_COALESCE_SECONDS = 5  # Collect announcements this long before sending
+ANNOUNCE_MAX_EMBEDS = 10       # Discord allows at most 10 embeds per message
+ANNOUNCE_BACKPRESSURE_DEPTH = 20  # Queued announcements before low-priority lanes get merged
+ANNOUNCE_PROTECTED_LANES = 2   # Top priority lanes that are never merged (Clan Master, Queen)
+ANNOUNCE_WEBHOOK_POOL_SIZE = 0  # Send announcements through this many channel webhooks (0 = bot account only)
+ANNOUNCE_WEBHOOK_NAME = "Imperial Attendance"  # Pool webhooks are found/created by this name
+PRESENCE_JOURNAL_DIR = "presence_journal"  # Day-rotated presence transition logs
+JOURNAL_FLUSH_SIZE = 200       # Buffered journal entries per write
+JOURNAL_RETENTION_DAYS = 91   # Day files kept - covers !heatmap's 90-day maximum plus today
+PRESENCE_QUEUE_SIZE = 5000     # Members waiting for a status check - overflow goes to the reconciliation pass
+PRESENCE_WORKERS = 4           # Tasks draining the presence queue
+ONLINE_TIME_RETENTION_DAYS = 90  # Daily online-time rollups kept in state
@@ -8,6 +8,7 @@ import requests
 import os
 import requests
 import datetime
+from metrics import presence_metrics
 
 app = Flask(__name__)
 
@@ -55,6 +56,11 @@ app = Flask(__name__)
 def home():
     return "Bot is alive!"
 
+@app.route('/metrics')
+def metrics():
+    """Presence-to-announcement latency and event counters as JSON"""
+    return presence_metrics.snapshot()
+
 def ping_self():
     """Continuously ping the Render URL to keep the service alive."""
     url = "https://newbot-discord.onrender.com"
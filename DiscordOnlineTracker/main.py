@@ -16,6 +16,8 @@ from recruitment import RecruitmentSystem
 from online_announce import OnlineAnnounce
 from cleanup import CleanupSystem, InactiveMemberVoteView
 from state_manager import StateManager
+import analytics
+from metrics import presence_metrics
 
 # Import your existing keep_alive
 try:
@@ -120,12 +122,29 @@ class ImperialBot(commands.Bot):
         self.add_command(commands.Command(name='checkmember', callback=self.check_member_status))
         self.add_command(commands.Command(name='help', callback=self.help_command))
         self.add_command(commands.Command(name='cfstatus', callback=self.cloudflare_status))  # New command
+        self.add_command(commands.Command(name='heatmap', callback=self.activity_heatmap))
+        self.add_command(commands.Command(name='queuestats', callback=self.announce_queue_stats))
+        self.add_command(commands.Command(name='latency', callback=self.presence_latency))
+        self.add_command(commands.Command(name='streaks', callback=self.attendance_streaks))
+        self.add_command(commands.Command(name='leaderboard', callback=self.attendance_leaderboard))
         
         # Add permission checks
         self.manual_cleanup.requires = commands.has_permissions(administrator=True)
         self.reset_member_check.requires = commands.has_permissions(administrator=True)
         self.force_interview.requires = commands.has_permissions(administrator=True)
         self.check_member_status.requires = commands.has_permissions(administrator=True)
+        self.activity_heatmap.requires = commands.has_permissions(administrator=True)
+        self.announce_queue_stats.requires = commands.has_permissions(administrator=True)
+        self.presence_latency.requires = commands.has_permissions(administrator=True)
+        self.attendance_streaks.requires = commands.has_permissions(administrator=True)
+        self.attendance_leaderboard.requires = commands.has_permissions(administrator=True)
+
+    def dispatch(self, event_name, /, *args, **kwargs):
+        """Dispatch events - untracked or unchanged presence updates are dropped here"""
+        if event_name == 'presence_update' and self.online_announce:
+            if not self.online_announce.accept_presence(*args):
+                return
+        super().dispatch(event_name, *args, **kwargs)
 
     async def setup_hook(self):
         """Setup hook - runs before on_ready"""
@@ -200,9 +219,15 @@ class ImperialBot(commands.Bot):
             logger.info(f'🏰 Main guild: {self.main_guild.name} (ID: {self.main_guild.id})')
             
             try:
+                # A fresh READY after a reconnect - keep online tracking and catch up
+                resuming_online_announce = self.online_announce is not None
+                if resuming_online_announce:
+                    await self.online_announce.resync_after_reconnect(self.main_guild)
+                
                 # Initialize systems
                 self.recruitment = RecruitmentSystem(self, self.main_guild, self.state)
-                self.online_announce = OnlineAnnounce(self, self.main_guild, self.state)
+                if not resuming_online_announce:
+                    self.online_announce = OnlineAnnounce(self, self.main_guild, self.state)
                 self.cleanup_system = CleanupSystem(self, self.main_guild, self.state)
                 
                 # Initialize check dates to prevent immediate flagging
@@ -219,7 +244,7 @@ class ImperialBot(commands.Bot):
                     self.cleanup_system.start_cleanup_task()
                     logger.info("✅ Cleanup task started with jitter")
                 
-                if hasattr(self.online_announce, 'start_tracking'):
+                if not resuming_online_announce and hasattr(self.online_announce, 'start_tracking'):
                     await asyncio.sleep(random.uniform(1, 5))
                     self.online_announce.start_tracking()
                     logger.info("✅ Online announcement tracking started with jitter")
@@ -242,6 +267,12 @@ class ImperialBot(commands.Bot):
         
         logger.info("✅ Bot is fully operational!")
 
+    async def on_resumed(self):
+        """Gateway session resumed - catch up on missed presence changes"""
+        logger.info("🔁 Gateway session resumed")
+        if self.online_announce and hasattr(self.online_announce, 'resync_after_reconnect'):
+            await self.online_announce.resync_after_reconnect()
+
     # ======== COMMAND METHODS ========
     
     async def test_command(self, ctx):
@@ -274,6 +305,18 @@ class ImperialBot(commands.Bot):
         
         embed.add_field(name="🔧 Systems", value="\n".join(systems) if systems else "❌ None", inline=False)
         
+        # Presence events filtered at dispatch
+        if self.online_announce and hasattr(self.online_announce, 'presence_filter_stats'):
+            filter_stats = self.online_announce.presence_filter_stats
+            embed.add_field(
+                name="📡 Presence Events",
+                value=f"✅ {filter_stats['accepted']} handled\n"
+                      f"🔇 {filter_stats['unchanged']} dropped (no status change)\n"
+                      f"🔇 {filter_stats['untracked']} dropped (untracked member)\n"
+                      f"🔗 {filter_stats['joined']} joined an in-flight check",
+                inline=False
+            )
+        
         await ctx.send(embed=embed)
         logger.info(f"Status command executed by {ctx.author.name}")
     
@@ -400,6 +443,11 @@ class ImperialBot(commands.Bot):
             else:
                 embed.add_field(name="📅 Last Check", value="Never checked", inline=True)
         
+        # Online time from presence transitions
+        if self.online_announce and hasattr(self.online_announce, 'get_online_minutes'):
+            minutes = self.online_announce.get_online_minutes(member.id, days=15)
+            embed.add_field(name="🕒 Online (15 days)", value=f"{minutes // 60}h {minutes % 60}m", inline=True)
+        
         # Dates
         if member.joined_at:
             join_date = member.joined_at.replace(tzinfo=None) if member.joined_at.tzinfo else member.joined_at
@@ -417,6 +465,253 @@ class ImperialBot(commands.Bot):
         await ctx.send(embed=embed)
         logger.info(f"Checkmember command executed by {ctx.author.name} for {member.name}")
     
+    async def activity_heatmap(self, ctx, days: int = 30):
+        """Show when tracked members are usually online"""
+        if not self.online_announce:
+            await ctx.send("❌ Online announce system not initialized")
+            return
+        
+        if not analytics.numpy_available:
+            await ctx.send("❌ Activity analytics need numpy - add it to the environment")
+            return
+        
+        days = max(1, min(days, 90))
+        self.online_announce.journal.flush()
+        
+        # File reading and array work run off the event loop
+        report = await asyncio.to_thread(
+            analytics.build_activity_report,
+            self.online_announce.journal,
+            dict(self.online_announce.tracked_members),
+            days
+        )
+        
+        embed = discord.Embed(
+            title=f"📈 Activity Heatmap (last {days} days)",
+            description=f"{report['active_members']}/{report['members']} tracked members seen online • server time",
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
+        )
+        
+        heatmap = report['heatmap']
+        weekday_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+        rows = ["    0     6     12    18   "]
+        rows.append("All " + analytics.render_heat_row(heatmap.mean(axis=0)))
+        for weekday, name in enumerate(weekday_names):
+            rows.append(f"{name} " + analytics.render_heat_row(heatmap[weekday]))
+        embed.add_field(name="🕐 Online by Hour", value="```\n" + "\n".join(rows) + "\n```", inline=False)
+        
+        hourly = heatmap.mean(axis=0)
+        busiest = sorted(range(24), key=lambda hour: hourly[hour], reverse=True)[:3]
+        embed.add_field(
+            name="🔥 Busiest Hours",
+            value="\n".join(f"{hour:02d}:00 - avg {hourly[hour]:.1f} online" for hour in busiest),
+            inline=True
+        )
+        
+        role_lines = []
+        for role_id, peaks in report['role_peaks'].items():
+            role_name = self.online_announce.role_config[role_id]['name']
+            role_lines.append(f"**{role_name}:** " + ", ".join(f"{hour:02d}:00" for hour in peaks))
+        embed.add_field(name="👑 Peak Hours by Role", value="\n".join(role_lines) or "No activity yet", inline=True)
+        
+        window_counts = {}
+        for start_hour, share in report['windows'].values():
+            window_counts[start_hour] = window_counts.get(start_hour, 0) + 1
+        common_windows = sorted(window_counts.items(), key=lambda item: item[1], reverse=True)[:3]
+        embed.add_field(
+            name="🎮 Most Common Play Windows",
+            value="\n".join(
+                f"{start:02d}:00-{(start + 3) % 24:02d}:00 - {count} members" for start, count in common_windows
+            ) or "No activity yet",
+            inline=False
+        )
+        
+        await ctx.send(embed=embed)
+        logger.info(f"Heatmap command executed by {ctx.author.name}")
+    
+    async def announce_queue_stats(self, ctx):
+        """Show announcement queue depth and wait times per priority lane"""
+        if not self.online_announce:
+            await ctx.send("❌ Online announce system not initialized")
+            return
+        
+        embed = discord.Embed(
+            title="📤 Announcement Queue",
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
+        )
+        
+        presence = self.online_announce.presence_queue.get_metrics()
+        embed.add_field(
+            name="📥 Presence Queue",
+            value=f"Depth: {presence['depth']}/{presence['max_size']} (max {presence['max_depth']})\n"
+                  f"Processed: {presence['processed']}/{presence['enqueued']}\n"
+                  f"Merged: {presence['merged']} • Overflowed: {presence['overflowed']}",
+            inline=False
+        )
+        
+        send_queues = list(self.online_announce.send_queues.values())
+        if not send_queues:
+            embed.description = "📭 No announcements have been queued yet"
+            await ctx.send(embed=embed)
+            return
+        
+        for send_queue in send_queues:
+            lanes = send_queue.get_metrics()
+            if len(send_queues) > 1:
+                # Several channels - only lanes that carried traffic, labelled by channel
+                lanes = [lane for lane in lanes if lane['enqueued']]
+            channel_label = f" • #{send_queue.channel.name}" if len(send_queues) > 1 else ""
+            
+            for lane in lanes:
+                embed.add_field(
+                    name=lane['lane'] + channel_label,
+                    value=f"Depth: {lane['depth']} (max {lane['max_depth']})\n"
+                          f"Sent: {lane['sent']}/{lane['enqueued']}\n"
+                          f"Merged: {lane['merged']} • Dropped: {lane['dropped']}\n"
+                          f"Wait: avg {lane['avg_wait']:.1f}s • max {lane['max_wait']:.1f}s",
+                    inline=True
+                )
+            
+            if send_queue.webhook_pool:
+                pool = send_queue.webhook_pool.get_metrics()
+                embed.add_field(
+                    name="🪝 Webhook Pool" + channel_label,
+                    value=f"Webhooks: {pool['webhooks']}/{pool['size']}\n"
+                          f"Via webhook: {pool['webhook']} • Via bot: {pool['fallback']}\n"
+                          f"Rate limited: {pool['rate_limited']}",
+                    inline=False
+                )
+        
+        await ctx.send(embed=embed)
+        logger.info(f"Queuestats command executed by {ctx.author.name}")
+    
+    async def attendance_streaks(self, ctx, member: discord.Member = None):
+        """Show a member's attendance streak, or the longest current streaks per role"""
+        if not self.online_announce:
+            await ctx.send("❌ Online announce system not initialized")
+            return
+        
+        if member:
+            stats = self.state.get_attendance_stats(member.id, datetime.now().date())
+            embed = discord.Embed(
+                title=f"🔥 Attendance: {member.display_name}",
+                color=discord.Color.orange(),
+                timestamp=datetime.now()
+            )
+            embed.add_field(name="🔥 Current Streak", value=f"{stats['streak']} days", inline=True)
+            embed.add_field(name="🏆 Best Streak", value=f"{stats['best_streak']} days", inline=True)
+            embed.add_field(name="📅 Active Days", value=f"{stats['active_days']}/30", inline=True)
+            await ctx.send(embed=embed)
+            logger.info(f"Streaks command executed by {ctx.author.name}")
+            return
+        
+        embed = discord.Embed(
+            title="🔥 Current Attendance Streaks",
+            description="Consecutive days online",
+            color=discord.Color.orange(),
+            timestamp=datetime.now()
+        )
+        
+        rankings = await self.online_announce.get_attendance_rankings(key="streak")
+        for role_id in self.online_announce.lane_role_ids:
+            entries = rankings.get(role_id)
+            if not entries:
+                continue
+            embed.add_field(
+                name=self.online_announce.role_config[role_id]['name'],
+                value="\n".join(
+                    f"{position}. <@{member_id}> - {stats['streak']} days (best {stats['best_streak']})"
+                    for position, (member_id, stats) in enumerate(entries, 1)
+                ),
+                inline=False
+            )
+        
+        if not rankings:
+            embed.description = "No active streaks yet"
+        
+        await ctx.send(embed=embed)
+        logger.info(f"Streaks command executed by {ctx.author.name}")
+    
+    async def attendance_leaderboard(self, ctx):
+        """Show the most active tracked members of the last 30 days per role"""
+        if not self.online_announce:
+            await ctx.send("❌ Online announce system not initialized")
+            return
+        
+        embed = discord.Embed(
+            title="🏆 Attendance Leaderboard",
+            description="Days online in the last 30 days",
+            color=discord.Color.gold(),
+            timestamp=datetime.now()
+        )
+        
+        rankings = await self.online_announce.get_attendance_rankings(key="active_days")
+        for role_id in self.online_announce.lane_role_ids:
+            entries = rankings.get(role_id)
+            if not entries:
+                continue
+            embed.add_field(
+                name=self.online_announce.role_config[role_id]['name'],
+                value="\n".join(
+                    f"{position}. <@{member_id}> - {stats['active_days']}/30 days • 🔥 {stats['streak']}"
+                    for position, (member_id, stats) in enumerate(entries, 1)
+                ),
+                inline=False
+            )
+        
+        if not rankings:
+            embed.description = "No attendance recorded yet"
+        
+        await ctx.send(embed=embed)
+        logger.info(f"Leaderboard command executed by {ctx.author.name}")
+    
+    async def presence_latency(self, ctx):
+        """Show presence-to-announcement latency per stage"""
+        snapshot = presence_metrics.snapshot()
+        stages = snapshot['stages_ms']
+        counters = snapshot['counters']
+        
+        embed = discord.Embed(
+            title="⏱️ Presence Announcement Latency",
+            description="Gateway event → handler → queue → `channel.send` (ms)",
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
+        )
+        
+        rows = [f"{'stage':<11}{'p50':>8}{'p95':>8}{'p99':>8}{'n':>7}"]
+        for stage, summary in stages.items():
+            if summary['p50'] is None:
+                rows.append(f"{stage:<11}{'-':>8}{'-':>8}{'-':>8}{0:>7}")
+            else:
+                rows.append(f"{stage:<11}{summary['p50']:>8}{summary['p95']:>8}{summary['p99']:>8}{summary['count']:>7}")
+        embed.add_field(name="📊 Stages", value="```\n" + "\n".join(rows) + "\n```", inline=False)
+        
+        embed.add_field(
+            name="🔢 Events",
+            value=f"Received: {counters['received']}\n"
+                  f"Dropped: {counters['dropped']}\n"
+                  f"Announced: {counters['announced']}\n"
+                  f"Errored: {counters['errored']}",
+            inline=True
+        )
+        
+        # Where the time goes: Discord (queue + send) or our own code (dispatch + process)
+        ours = sum(stages[stage]['p95'] or 0 for stage in ("dispatch", "process"))
+        discord_side = sum(stages[stage]['p95'] or 0 for stage in ("queue", "send"))
+        if not discord_side and not ours:
+            bottleneck = "No announcements yet"
+        elif discord_side >= ours:
+            bottleneck = "🌐 Discord send/rate limits"
+        else:
+            bottleneck = "🤖 Bot processing"
+        embed.add_field(name="🚧 Bottleneck (p95)", value=bottleneck, inline=True)
+        embed.set_footer(text="Also available as JSON at /metrics")
+        
+        await ctx.send(embed=embed)
+        logger.info(f"Latency command executed by {ctx.author.name}")
+    
     async def help_command(self, ctx):
         """Show available commands"""
         embed = discord.Embed(
@@ -430,7 +725,12 @@ class ImperialBot(commands.Bot):
             ("`!cleanup`", "Run manual cleanup (ghost + inactive check)"),
             ("`!resetcheck @user`", "Reset member's inactivity check date"),
             ("`!interview @user`", "Force start interview for member"),
-            ("`!checkmember @user`", "Check member's detailed status")
+            ("`!checkmember @user`", "Check member's detailed status"),
+            ("`!heatmap [days]`", "Show hourly activity heatmap"),
+            ("`!queuestats`", "Show announcement queue metrics per lane"),
+            ("`!latency`", "Show presence announcement latency"),
+            ("`!streaks [@user]`", "Show attendance streaks"),
+            ("`!leaderboard`", "Show attendance rankings per role")
         ]
         
         # Public commands
@@ -548,10 +848,28 @@ class ImperialBot(commands.Bot):
                 if member.id in self.cleanup_system.member_last_check:
                     del self.cleanup_system.member_last_check[member.id]
                     logger.info(f"Removed {member.name} from cleanup tracking")
+            
+            # Remove from online announcement tracking
+            if self.online_announce and hasattr(self.online_announce, 'on_member_remove'):
+                self.online_announce.on_member_remove(member)
                 
         except Exception as e:
             logger.error(f"❌ Error in on_member_remove: {e}")
     
+    async def on_member_update(self, before, after):
+        """Handle member updates (role changes)"""
+        try:
+            # Keep the online announcement role index current
+            if self.online_announce and hasattr(self.online_announce, 'on_member_update'):
+                self.online_announce.on_member_update(before, after)
+            
+            # Keep the demotion index current
+            if self.cleanup_system and hasattr(self.cleanup_system, 'on_member_update'):
+                self.cleanup_system.on_member_update(before, after)
+                
+        except Exception as e:
+            logger.error(f"❌ Error in on_member_update: {e}")
+    
     async def on_presence_update(self, before, after):
         """Handle presence status changes (online/offline/idle/dnd)"""
         try:
@@ -603,6 +921,10 @@ class ImperialBot(commands.Bot):
     async def close(self):
         """Clean up on close"""
         logger.info("🔒 Cleaning up connections...")
+        if self.online_announce:
+            self.online_announce.journal.flush()
+            await self.online_announce.flush_online_time()
+        self.state.save_state()
         await cf_session.close()
         await super().close()
 
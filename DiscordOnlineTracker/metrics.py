@@ -0,0 +1,75 @@
+import time
+import threading
+from collections import deque
+
+class LatencyHistogram:
+    """Rolling window of latency samples (seconds) with percentile summaries"""
+
+    def __init__(self, size=2048):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def record(self, seconds):
+        """Add a sample"""
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        """p50/p95/p99/max in milliseconds over the current window"""
+        samples = sorted(self.samples)
+        if not samples:
+            return {"count": self.count, "p50": None, "p95": None, "p99": None, "max": None}
+
+        def percentile(fraction):
+            return round(samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000, 1)
+
+        return {
+            "count": self.count,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": round(samples[-1] * 1000, 1),
+        }
+
+class PresenceMetrics:
+    """Latency from gateway presence event to announcement, per stage.
+
+    Stages:
+        dispatch   - event received -> a presence worker picks the member up
+        process    - handler starts -> announcement queued (our own code)
+        queue      - queued -> channel.send starts (coalescing window, waiting behind other sends)
+        send       - channel.send duration (Discord REST, including rate-limit sleeps)
+        end_to_end - event received -> announcement sent
+    """
+
+    STAGES = ("dispatch", "process", "queue", "send", "end_to_end")
+    COUNTERS = ("received", "dropped", "merged", "overflowed", "announced", "errored")
+
+    def __init__(self):
+        self.started = time.time()
+        self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.counters = {counter: 0 for counter in self.COUNTERS}
+        # Snapshots are read from the keep_alive web thread
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """Record a stage latency"""
+        with self.lock:
+            self.histograms[stage].record(seconds)
+
+    def increment(self, counter, amount=1):
+        """Increment an event counter"""
+        self.counters[counter] += amount
+
+    def snapshot(self):
+        """Machine-readable view of all stages and counters"""
+        with self.lock:
+            stages = {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+        return {
+            "uptime_seconds": round(time.time() - self.started),
+            "counters": dict(self.counters),
+            "stages_ms": stages,
+        }
+
+# Shared by OnlineAnnounce, the admin command and the keep_alive endpoint
+presence_metrics = PresenceMetrics()
@@ -1,50 +1,400 @@
 import discord
 from discord.ext import commands, tasks
 import asyncio
-from datetime import datetime
+import heapq
+from datetime import datetime, timedelta
 import logging
+import time
+from collections import deque
+from zoneinfo import ZoneInfo
+
+import config
+from metrics import presence_metrics
+from presence_journal import PresenceJournal
+from webhook_pool import WebhookPool
 
 logger = logging.getLogger(__name__)
 
+# Attendance rankings (!streaks / !leaderboard)
+RANKING_KEYS = ("active_days", "streak")
+RANKING_SIZE = 10  # Entries kept per role and key
+RANKING_WINDOW = 30  # Days counted for active_days
+
+# Announcement sends
+MESSAGE_EMBED_CHARS = 6000  # Discord's limit on the combined size of a message's embeds
+SEND_ATTEMPTS = 3  # Tries per announcement before it is given up
+SEND_RETRY_SECONDS = 2.0  # Pause before a failed batch is retried
+
+def ranking_order(entry, key):
+    """Sort key for a (member_id, stats) ranking entry"""
+    stats = entry[1]
+    return (stats[key], stats["streak"], stats["active_days"])
+
+class AnnouncementQueue:
+    """Priority send queue for one announcement channel.
+    
+    Lane 0 is the highest priority. Pending embeds are coalesced into
+    multi-embed messages, highest lanes first. When the queue backs up
+    (the channel is rate-limited), lower lanes are merged into one summary
+    embed each, except for the protected top lanes.
+    
+    With a webhook pool, one message per pool webhook is sent concurrently;
+    otherwise messages go out one at a time through channel.send. A batch
+    the API rejects is split into single-embed messages; any other failure
+    puts the batch back at the front of its lanes for another try.
+    """
+    
+    def __init__(self, channel, lane_names, coalesce_seconds, max_embeds, backpressure_depth, protected_lanes, webhook_pool=None):
+        self.channel = channel
+        self.webhook_pool = webhook_pool
+        self.lane_names = lane_names
+        self.lanes = [deque() for _ in lane_names]  # [(enqueued_at, embed, mentions, received_at, attempts)]
+        self.coalesce_seconds = coalesce_seconds
+        self.max_embeds = max_embeds
+        self.backpressure_depth = backpressure_depth
+        self.protected_lanes = protected_lanes
+        
+        self.flush_task = None
+        self.batch_ready = asyncio.Event()
+        self.stats = [
+            {"enqueued": 0, "sent": 0, "merged": 0, "dropped": 0, "max_depth": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for _ in lane_names
+        ]
+    
+    def depth(self):
+        """Total number of queued embeds across all lanes"""
+        return sum(len(lane) for lane in self.lanes)
+    
+    def put(self, lane, embed, mention, received_at=None):
+        """Queue an embed - the send happens in the background flush task"""
+        self.lanes[lane].append((time.monotonic(), embed, [mention], received_at, 0))
+        stats = self.stats[lane]
+        stats["enqueued"] += 1
+        stats["max_depth"] = max(stats["max_depth"], len(self.lanes[lane]))
+        
+        if not self.flush_task or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush())
+        elif self.depth() >= self.max_embeds:
+            # Flush early - a full message is waiting
+            self.batch_ready.set()
+    
+    def merge_lane(self, lane):
+        """Collapse a lane into a single summary embed"""
+        items = self.lanes[lane]
+        if len(items) < 2:
+            return
+        
+        enqueued_at = min(item[0] for item in items)
+        mentions = [mention for item in items for mention in item[2]]
+        received_times = [item[3] for item in items if item[3] is not None]
+        
+        # Keep the summary inside the 4096 character description limit
+        kept = []
+        length = 0
+        for mention in mentions:
+            if length + len(mention) + 2 > 3900:
+                break
+            kept.append(mention)
+            length += len(mention) + 2
+        
+        description = f"🟢 **{len(mentions)} {self.lane_names[lane]} members** came online: " + ", ".join(kept)
+        if len(kept) < len(mentions):
+            description += f" …and {len(mentions) - len(kept)} more"
+        
+        self.stats[lane]["merged"] += len(items) - 1
+        self.stats[lane]["dropped"] += len(mentions) - len(kept)
+        items.clear()
+        items.append((
+            enqueued_at,
+            discord.Embed(description=description, color=discord.Color.green()),
+            kept,
+            min(received_times) if received_times else None,
+            0
+        ))
+    
+    def apply_backpressure(self):
+        """Merge lanes from the lowest priority up until the queue is shallow again"""
+        for lane in range(len(self.lanes) - 1, self.protected_lanes - 1, -1):
+            if self.depth() <= self.backpressure_depth:
+                return
+            self.merge_lane(lane)
+    
+    def take_batch(self):
+        """Take up to max_embeds queued items, highest priority lanes first.
+        
+        Stops early once the next embed would push the message past Discord's
+        combined embed size limit - a merged summary usually fills a message.
+        """
+        batch = []
+        chars = 0
+        for lane, items in enumerate(self.lanes):
+            while items and len(batch) < self.max_embeds:
+                size = len(items[0][1])
+                if batch and chars + size > MESSAGE_EMBED_CHARS:
+                    return batch
+                batch.append((lane, items.popleft()))
+                chars += size
+            if len(batch) >= self.max_embeds:
+                break
+        return batch
+    
+    def requeue(self, batch):
+        """Put a failed batch back at the front of its lanes - returns how many were given up"""
+        given_up = 0
+        for lane, item in reversed(batch):
+            enqueued_at, embed, mentions, received_at, attempts = item
+            if attempts + 1 >= SEND_ATTEMPTS:
+                given_up += len(mentions)
+                continue
+            self.lanes[lane].appendleft((enqueued_at, embed, mentions, received_at, attempts + 1))
+        return given_up
+    
+    async def flush(self):
+        """Wait out the coalescing window (cut short when a batch fills), then send everything"""
+        try:
+            if self.depth() < self.max_embeds and self.coalesce_seconds > 0:
+                try:
+                    await asyncio.wait_for(self.batch_ready.wait(), self.coalesce_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            while self.depth():
+                # Anything set while the last round was sending is consumed by this round
+                self.batch_ready.clear()
+                self.apply_backpressure()
+                batches = []
+                for _ in range(self.webhook_pool.size if self.webhook_pool else 1):
+                    batch = self.take_batch()
+                    if not batch:
+                        break
+                    batches.append(batch)
+                await asyncio.gather(*(self.send_batch(batch) for batch in batches))
+            
+            # Queue drained - the next flush gets its full coalescing window
+            self.batch_ready.clear()
+            
+        except Exception as e:
+            logger.error(f"❌ Error flushing announcement queue: {e}")
+    
+    async def send_batch(self, batch):
+        """Send one batch as a single multi-embed message and record its metrics"""
+        embeds = [item[1] for lane, item in batch]
+        send_started = time.monotonic()
+        try:
+            if self.webhook_pool:
+                await self.webhook_pool.send(embeds)
+            else:
+                await self.channel.send(embeds=embeds)
+            logger.debug(f"📤 Sent {len(batch)} announcement(s) in one message")
+        except discord.HTTPException as e:
+            if e.status == 400 and len(batch) > 1:
+                # Rejected payload - send each embed on its own instead
+                logger.warning(f"⚠️ Message of {len(batch)} announcements rejected ({e}) - sending them one by one")
+                for item in batch:
+                    await self.send_batch([item])
+                return
+            if e.status == 400:
+                logger.error(f"❌ Announcement rejected: {e}")
+                presence_metrics.increment("errored", len(batch[0][1][2]))
+                return
+            await self.retry_batch(batch, e)
+            return
+        except Exception as e:
+            await self.retry_batch(batch, e)
+            return
+        
+        now = time.monotonic()
+        presence_metrics.record("send", now - send_started)
+        presence_metrics.increment("announced", sum(len(item[2]) for lane, item in batch))
+        
+        for lane, (enqueued_at, embed, mentions, received_at, attempts) in batch:
+            wait = send_started - enqueued_at
+            stats = self.stats[lane]
+            stats["sent"] += 1
+            stats["wait_total"] += wait
+            stats["wait_max"] = max(stats["wait_max"], wait)
+            
+            presence_metrics.record("queue", wait)
+            if received_at is not None:
+                presence_metrics.record("end_to_end", now - received_at)
+    
+    async def retry_batch(self, batch, error):
+        """Requeue a batch after a failed send and pause before the next round"""
+        given_up = self.requeue(batch)
+        if given_up:
+            logger.error(f"❌ Gave up on {given_up} announcement(s) after {SEND_ATTEMPTS} attempts: {error}")
+            presence_metrics.increment("errored", given_up)
+        else:
+            logger.warning(f"⚠️ Error sending {len(batch)} announcement(s), retrying: {error}")
+        await asyncio.sleep(SEND_RETRY_SECONDS)
+    
+    def get_metrics(self):
+        """Per-lane queue depth and wait-time metrics"""
+        metrics = []
+        for lane, name in enumerate(self.lane_names):
+            stats = self.stats[lane]
+            metrics.append({
+                "lane": name,
+                "depth": len(self.lanes[lane]),
+                "max_depth": stats["max_depth"],
+                "enqueued": stats["enqueued"],
+                "sent": stats["sent"],
+                "merged": stats["merged"],
+                "dropped": stats["dropped"],
+                "avg_wait": stats["wait_total"] / stats["sent"] if stats["sent"] else 0.0,
+                "max_wait": stats["wait_max"],
+            })
+        return metrics
+
+class PresenceEventQueue:
+    """Bounded queue of tracked members waiting for a status check.
+    
+    Holds at most one entry per member: a newer event for a member who is
+    already waiting merges into the pending entry, since the check reads the
+    member's live status anyway. When the queue is full, put() refuses new
+    members and the caller hands them to the reconciliation pass instead,
+    so memory stays bounded during gateway bursts.
+    """
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.pending = {}  # {member_id: (member, received_at)} in arrival order
+        self.not_empty = asyncio.Event()
+        self.stats = {"enqueued": 0, "merged": 0, "overflowed": 0, "processed": 0, "max_depth": 0}
+    
+    def put(self, member, received_at=None):
+        """Queue a member's status check - returns False if the queue is full"""
+        pending = self.pending.get(member.id)
+        if pending:
+            # Keep the earliest receive time so latency covers the whole wait
+            self.pending[member.id] = (member, pending[1] if pending[1] is not None else received_at)
+            self.stats["merged"] += 1
+            presence_metrics.increment("merged")
+            return True
+        
+        if len(self.pending) >= self.max_size:
+            self.stats["overflowed"] += 1
+            presence_metrics.increment("overflowed")
+            return False
+        
+        self.pending[member.id] = (member, received_at)
+        self.stats["enqueued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self.pending))
+        self.not_empty.set()
+        return True
+    
+    async def get(self):
+        """Wait for and take the oldest pending member"""
+        while not self.pending:
+            self.not_empty.clear()
+            await self.not_empty.wait()
+        member_id = next(iter(self.pending))
+        return self.pending.pop(member_id)
+    
+    def get_metrics(self):
+        """Current depth plus lifetime counters"""
+        return {"depth": len(self.pending), "max_size": self.max_size, **self.stats}
+
 class OnlineAnnounce:
     def __init__(self, bot, guild, state):
         self.bot = bot
         self.guild = guild
         self.state = state
         self.online_members = set()  # Track currently announced members
+        self.drift_candidates = set()  # Members whose presence event we could not act on
+        
+        # Flap suppression - epoch seconds per member
+        self.announce_deadlines = {}  # {member_id: earliest time to announce again}
+        self.offline_since = {}  # {member_id: time they went offline}
+        self.online_cooldown = config.ONLINE_COOLDOWN
+        self.offline_threshold = config.OFFLINE_THRESHOLD
+        
+        # Online-time accumulator - flushed into daily rollups in StateManager
+        self.session_starts = {}  # {member_id: epoch seconds the current session started}
+        self.online_time = {}  # {date: {member_id: seconds}} not yet flushed
+        
+        # Durable record of every status transition of tracked members
+        self.journal = PresenceJournal(config.PRESENCE_JOURNAL_DIR, config.JOURNAL_FLUSH_SIZE)
+        
         self.announce_channel_id = 1437768842871832597  # Attendance channel
         self.bot_startup_time = datetime.now()
         
+        # Prioritised, coalescing send queues - one per announcement channel, created on first use
+        self.send_queues = {}  # {channel_id: AnnouncementQueue}
+        self.missing_role_channels = set()  # Role channel ids already warned about
+        
+        # Board mode - one pinned message listing who is online, edited in place
+        self.announce_mode = config.ANNOUNCE_MODE
+        self.board_message = None
+        self.board_dirty = False
+        self.last_board_content = None
+        
+        # Daily mode - members announced today, reset at midnight in the configured timezone
+        self.announce_tz = self.load_timezone(config.ANNOUNCE_TIMEZONE)
+        self.announced_day = None
+        self.announced_today = set()
+        
         # Role configuration - INCLUDES INACTIVE ROLE
+        # Add "channel_id" to a role to announce it in its own channel (own send queue and rate limit)
         self.role_config = {
             1437570031822176408: {  # Impèrius🔥
                 "name": "Impèrius🔥",
+                "priority": 4,  # Send lane (0 = first)
                 "format": "{role} {member} is online!"
             },
             1437572916005834793: {  # OG-Impèrius🐦‍🔥
                 "name": "OG-Impèrius🐦‍🔥", 
+                "priority": 3,  # Send lane (0 = first)
                 "format": "{role} {member} is online!"
             },
             1389835747040694332: {  # Cᥣᥲᥒ Mᥲstᥱr🌟
                 "name": "Cᥣᥲᥒ Mᥲstᥱr🌟",
+                "priority": 0,  # Send lane (0 = first)
                 "format": "The Cᥣᥲᥒ Mᥲstᥱr🌟 {member} is online!"
             },
             1437578521374363769: {  # Queen❤️‍🔥
                 "name": "Queen❤️‍🔥",
+                "priority": 1,  # Send lane (0 = first)
                 "format": "The Queen❤️‍🔥 {member} is online!"
             },
             1438420490455613540: {  # cute ✨
                 "name": "cute ✨",
+                "priority": 2,  # Send lane (0 = first)
                 "format": "Most cute ✨ {member} went online!"
             },
             1454803208995340328: {  # Inactive role - ADDED FOR TRACKING
                 "name": "Inactive",
+                "priority": 5,  # Send lane (0 = first)
                 "format": "Inactive {member} is online!"
             }
         }
         
-        self.tracked_role_ids = list(self.role_config.keys())
+        # Send lanes ordered by priority
+        self.lane_role_ids = sorted(self.role_config, key=lambda role_id: self.role_config[role_id]["priority"])
+        self.role_lanes = {role_id: lane for lane, role_id in enumerate(self.lane_role_ids)}
+        
+        # Announce precedence follows priority too (first match wins), so a
+        # Clan Master who also holds Impèrius is announced - and sent - as Clan Master
+        self.tracked_role_ids = list(self.lane_role_ids)
+        self.tracked_members = {}  # {member_id: announce role_id}
         self.initialized = False
+        
+        # Last status seen per tracked member - diffed after a gateway reconnect
+        self.status_snapshot = {}  # {member_id: status string}
+        
+        # Presence events seen by the dispatch-time filter
+        self.presence_filter_stats = {"accepted": 0, "unchanged": 0, "untracked": 0, "joined": 0}
+        self.event_received_at = {}  # {member_id: monotonic time the gateway event was dispatched}
+        
+        # Per-role attendance rankings - rebuilt once a day, updated on every arrival
+        self.rankings = None  # {key: {role_id: [(member_id, stats), ...]}}
+        self.rankings_day = None
+        
+        # Single-flight status checks - one evaluation per member at a time
+        self.status_checks = {}  # {member_id: future resolved when the in-flight check finishes}
+        
+        # Presence events are checked by a fixed set of workers, not in the dispatch handler
+        self.presence_queue = PresenceEventQueue(config.PRESENCE_QUEUE_SIZE)
+        self.presence_workers = []
     
     def start_tracking(self):
         """Start tracking online members"""
@@ -52,64 +402,382 @@ class OnlineAnnounce:
         
         # Clear tracking
         self.online_members.clear()
+        self.build_member_index()
+        
+        # Diff the checkpointed announce state against the live cache
+        saved = {int(user_id): self.state.get_online_tracking(user_id) for user_id in self.state.get_all_tracked_users()}
+        saved_online = {member_id for member_id, tracking in saved.items() if tracking.get('online')}
+        new_online = 0
         
-        # Mark current online members
-        for member in self.guild.members:
-            if member.status != discord.Status.offline and not member.bot:
-                has_tracked_role = any(role.id in self.tracked_role_ids for role in member.roles)
-                if has_tracked_role:
-                    self.online_members.add(member.id)
+        # Restore cooldown deadlines from the last announcement times
+        now = time.time()
+        for member_id, tracking in saved.items():
+            try:
+                last_announced = datetime.fromisoformat(tracking['last_announced']).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+            if last_announced + self.online_cooldown > now:
+                self.announce_deadlines[member_id] = last_announced + self.online_cooldown
         
-        logger.info(f"📊 Already online: {len(self.online_members)} tracked members")
+        for member_id in self.tracked_members:
+            member = self.guild.get_member(member_id)
+            if member:
+                self.status_snapshot[member_id] = str(member.status)
+            if member and member.status != discord.Status.offline:
+                if not saved or member_id in saved_online:
+                    # Already announced before the restart (or first boot) - don't re-announce
+                    self.mark_online(member_id)
+                    self.record_attendance(member_id, datetime.now())
+                else:
+                    # Came online while we were down - reconciliation announces them
+                    self.drift_candidates.add(member_id)
+                    new_online += 1
+        
+        # Members saved as online who are now offline or untracked
+        for member_id in saved_online - self.online_members:
+            self.checkpoint_member(member_id)
+        
+        logger.info(
+            f"📊 Already online: {len(self.online_members)} tracked members, "
+            f"{new_online} came online while offline"
+        )
+        self.initialized = True
         
         # Start tasks
-        self.init_delayed.start()
+        self.start_presence_workers()
         self.presence_check.start()
+        self.flush_online_time.start()
+        
+        if self.announce_mode == "board":
+            logger.warning("⚠️ Board mode: arrivals are not posted to attendance history")
+            self.board_dirty = True
+            self.update_board.change_interval(seconds=config.BOARD_UPDATE_SECONDS)
+            self.update_board.start()
+        elif self.announce_mode == "daily":
+            logger.info(f"📅 Daily mode: each member is announced once per day ({config.ANNOUNCE_TIMEZONE})")
+        elif self.announce_mode == "silent":
+            logger.info(f"🤫 Silent mode: posting an attendance digest every {config.ATTENDANCE_DIGEST_HOURS}h")
+            self.post_attendance_digest.change_interval(hours=config.ATTENDANCE_DIGEST_HOURS)
+            self.post_attendance_digest.start()
     
-    @tasks.loop(count=1)
-    async def init_delayed(self):
-        """Wait 30 seconds after bot startup before initializing"""
-        await asyncio.sleep(30)
-        logger.info("✅ Delayed initialization complete")
-        self.initialized = True
+    def build_member_index(self):
+        """Build the member -> announce role index from the tracked role member lists"""
+        index = {}
+        
+        for role_id in self.tracked_role_ids:
+            role = self.guild.get_role(role_id)
+            if not role:
+                logger.warning(f"⚠️ Tracked role not found: {role_id}")
+                continue
+            
+            for member in role.members:
+                # Higher priority roles take precedence
+                if not member.bot and member.id not in index:
+                    index[member.id] = role_id
+        
+        self.tracked_members = index
+        self.rankings = None
+        logger.info(f"📇 Indexed {len(index)} tracked members")
+    
+    def resolve_announce_role(self, member):
+        """Get the announce role ID for a single member, or None if untracked"""
+        if member.bot:
+            return None
+        
+        member_role_ids = {role.id for role in member.roles}
+        for role_id in self.tracked_role_ids:
+            if role_id in member_role_ids:
+                return role_id
+        return None
+    
+    def on_member_update(self, before, after):
+        """Keep the tracked member index current from role changes"""
+        try:
+            if not after.guild or after.guild.id != self.guild.id:
+                return
+            
+            changed_role_ids = {role.id for role in before.roles} ^ {role.id for role in after.roles}
+            if not changed_role_ids.intersection(self.role_config):
+                return
+            
+            role_id = self.resolve_announce_role(after)
+            if role_id:
+                newly_tracked = after.id not in self.tracked_members
+                self.tracked_members[after.id] = role_id
+                if newly_tracked and after.status != discord.Status.offline:
+                    # Role granted while online - treat it as an arrival and queue its check
+                    self.handle_status_change(after, discord.Status.offline, after.status)
+            else:
+                self.tracked_members.pop(after.id, None)
+                self.status_snapshot.pop(after.id, None)
+                self.mark_offline(after.id)
+            self.board_dirty = True
+            # Member may have moved between role rankings
+            self.rankings = None
+                
+        except Exception as e:
+            logger.error(f"❌ Error updating tracked member index: {e}")
+    
+    def on_member_remove(self, member):
+        """Drop a member who left from all tracking"""
+        self.tracked_members.pop(member.id, None)
+        self.status_snapshot.pop(member.id, None)
+        self.online_members.discard(member.id)
+        self.end_session(member.id)
+        self.announce_deadlines.pop(member.id, None)
+        self.offline_since.pop(member.id, None)
+        self.board_dirty = True
+        self.state.remove_online_tracking(member.id)
+        self.rankings = None
+    
+    def checkpoint_member(self, member_id, announced=False):
+        """Write a member's announce state into the online_tracking section"""
+        tracking = self.state.get_online_tracking(member_id) or {}
+        tracking['online'] = member_id in self.online_members
+        if announced:
+            tracking['last_announced'] = datetime.now().isoformat()
+        self.state.set_online_tracking(member_id, tracking)
+    
+    def should_announce(self, member_id):
+        """Flap suppression - announce only after a real absence and an expired cooldown"""
+        now = time.time()
+        
+        offline_since = self.offline_since.pop(member_id, None)
+        if offline_since is not None and now - offline_since < self.offline_threshold:
+            return False
+        
+        deadline = self.announce_deadlines.get(member_id)
+        if deadline is not None:
+            if now < deadline:
+                return False
+            del self.announce_deadlines[member_id]
+        
+        return True
+    
+    def load_timezone(self, name):
+        """Resolve the daily-mode timezone, falling back to server time"""
+        try:
+            return ZoneInfo(name)
+        except Exception as e:
+            logger.warning(f"⚠️ Unknown timezone {name!r} ({e}) - daily mode uses server time")
+            return None
+    
+    def claim_daily_announcement(self, member_id):
+        """True the first time a member comes online today - records the member as announced"""
+        today = datetime.now(self.announce_tz).date()
+        if today != self.announced_day:
+            self.announced_day = today
+            self.announced_today = self.state.get_daily_announced(today)
+        
+        if member_id in self.announced_today:
+            return False
+        
+        self.announced_today.add(member_id)
+        self.state.add_daily_announced(today, member_id)
+        return True
+    
+    def credit_online_time(self, member_id, start, end):
+        """Add a session span to the accumulator, split at local midnight"""
+        while start < end:
+            day = datetime.fromtimestamp(start).date()
+            next_midnight = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+            span_end = min(end, next_midnight)
+            day_totals = self.online_time.setdefault(day, {})
+            day_totals[member_id] = day_totals.get(member_id, 0) + (span_end - start)
+            start = span_end
+    
+    def end_session(self, member_id):
+        """Close a member's online session and credit its time"""
+        start = self.session_starts.pop(member_id, None)
+        if start is not None:
+            self.credit_online_time(member_id, start, time.time())
+    
+    def get_online_minutes(self, member_id, days=15):
+        """Minutes a member was online over the last N days (today included)"""
+        today = datetime.now().date()
+        total = 0
+        for offset in range(days):
+            day = today - timedelta(days=offset)
+            total += self.state.get_online_seconds(day, member_id)
+            total += self.online_time.get(day, {}).get(member_id, 0)
+        
+        start = self.session_starts.get(member_id)
+        if start is not None:
+            window_start = datetime.combine(today - timedelta(days=days - 1), datetime.min.time()).timestamp()
+            total += time.time() - max(start, window_start)
+        
+        return int(total // 60)
+    
+    def record_attendance(self, member_id, seen_at):
+        """Record a member as seen in the attendance ledger and keep the rankings current"""
+        self.state.record_attendance(member_id, seen_at)
+        self.update_rankings(member_id)
+    
+    def build_rankings(self, tracked_members, today):
+        """Full pass over the roster - {key: {role_id: [(member_id, stats), ...]}}, best first"""
+        by_role = {}
+        for member_id, role_id in tracked_members.items():
+            stats = self.state.get_attendance_stats(member_id, today, RANKING_WINDOW)
+            if stats["active_days"]:
+                by_role.setdefault(role_id, []).append((member_id, stats))
+        
+        return {
+            key: {
+                role_id: heapq.nlargest(RANKING_SIZE, entries, key=lambda entry: ranking_order(entry, key))
+                for role_id, entries in by_role.items()
+            }
+            for key in RANKING_KEYS
+        }
+    
+    async def get_attendance_rankings(self, key="active_days", top=5):
+        """Top tracked members per role by an attendance stat - {role_id: [(member_id, stats), ...]}.
+        
+        Served from per-role top lists kept current on every arrival. The full
+        roster pass only runs when the day changes (windows slide, streaks
+        expire) or the role index was rebuilt, and then off the event loop.
+        """
+        today = datetime.now().date()
+        if self.rankings is None or self.rankings_day != today:
+            tracked_members = dict(self.tracked_members)
+            self.rankings = await asyncio.to_thread(self.build_rankings, tracked_members, today)
+            self.rankings_day = today
+        
+        rankings = {}
+        for role_id, entries in self.rankings[key].items():
+            entries = [entry for entry in entries[:top] if entry[1][key]]
+            if entries:
+                rankings[role_id] = entries
+        return rankings
+    
+    def update_rankings(self, member_id):
+        """Re-rank one member after an arrival - stats only grow during a day, so O(top) per list"""
+        if self.rankings is None or self.rankings_day != datetime.now().date():
+            return
+        
+        role_id = self.tracked_members.get(member_id)
+        if not role_id:
+            return
+        
+        stats = self.state.get_attendance_stats(member_id, self.rankings_day, RANKING_WINDOW)
+        for key in RANKING_KEYS:
+            entries = [entry for entry in self.rankings[key].get(role_id, []) if entry[0] != member_id]
+            entries.append((member_id, stats))
+            entries.sort(key=lambda entry: ranking_order(entry, key), reverse=True)
+            self.rankings[key][role_id] = entries[:RANKING_SIZE]
+    
+    @tasks.loop(minutes=5)
+    async def flush_online_time(self):
+        """Flush accumulated online time into the daily rollups"""
+        try:
+            # Credit open sessions up to now so rollups stay current, and keep
+            # the attendance ledger's last_seen fresh through long sessions
+            now = time.time()
+            seen_at = datetime.now()
+            for member_id, start in list(self.session_starts.items()):
+                self.credit_online_time(member_id, start, now)
+                self.session_starts[member_id] = now
+                self.record_attendance(member_id, seen_at)
+            
+            pending, self.online_time = self.online_time, {}
+            for day, day_totals in pending.items():
+                for member_id, seconds in day_totals.items():
+                    self.state.add_online_seconds(day, member_id, round(seconds))
+            
+            oldest_day = datetime.now().date() - timedelta(days=config.ONLINE_TIME_RETENTION_DAYS)
+            self.state.prune_online_rollups(oldest_day)
+            self.journal.prune(datetime.now().date() - timedelta(days=config.JOURNAL_RETENTION_DAYS))
+            
+        except Exception as e:
+            logger.error(f"❌ Error flushing online time: {e}")
+    
+    def mark_online(self, member_id, announced=False):
+        """Record a member as online"""
+        self.online_members.add(member_id)
+        self.offline_since.pop(member_id, None)
+        self.session_starts.setdefault(member_id, time.time())
+        if announced:
+            self.announce_deadlines[member_id] = time.time() + self.online_cooldown
+        self.board_dirty = True
+        self.checkpoint_member(member_id, announced)
+    
+    def mark_offline(self, member_id):
+        """Record a member as offline"""
+        if member_id in self.online_members:
+            self.online_members.discard(member_id)
+            self.offline_since[member_id] = time.time()
+            # Session end is the latest moment they were seen
+            self.record_attendance(member_id, datetime.now())
+            self.end_session(member_id)
+            self.board_dirty = True
+            self.checkpoint_member(member_id)
     
     @tasks.loop(seconds=45)
     async def presence_check(self):
-        """Main presence checking task"""
+        """Reconciliation pass - presence changes are handled in on_presence_update.
+        
+        Only members we believe are online, plus members whose events were
+        skipped, can have drifted from the cache, so only those are re-checked.
+        """
         if not self.initialized:
             return
             
         try:
+            self.journal.flush()
+            
             channel = self.guild.get_channel(self.announce_channel_id)
             if not channel:
                 return
             
-            # Check each member
-            for member in self.guild.members:
+            candidates = self.online_members | self.drift_candidates
+            self.drift_candidates.clear()
+            
+            for member_id in candidates:
+                member = self.guild.get_member(member_id)
+                if not member:
+                    # Member left the guild - stop tracking
+                    self.status_snapshot.pop(member_id, None)
+                    self.mark_offline(member_id)
+                    continue
                 await self.check_member_status(member, channel)
                 
         except Exception as e:
             logger.error(f"❌ Error in presence_check: {e}")
     
-    async def check_member_status(self, member, channel):
-        """Check and announce a single member's status"""
-        try:
-            # Skip bots
-            if member.bot:
+    async def check_member_status(self, member, channel, received_at=None):
+        """Check and announce a single member's status.
+        
+        on_presence_update and presence_check can both reach the same member
+        at once, so only one evaluation per member runs; later callers wait
+        for it and only re-evaluate if the status moved on in the meantime.
+        """
+        joined = False
+        while (in_flight := self.status_checks.get(member.id)):
+            # Another waiter may have taken the slot while we slept - keep waiting
+            joined = True
+            await asyncio.shield(in_flight)
+        
+        if joined:
+            self.presence_filter_stats["joined"] += 1
+            is_online = member.status != discord.Status.offline
+            if is_online == (member.id in self.online_members) or member.id not in self.tracked_members:
                 return
-            
-            # Check if member has any tracked role
-            has_tracked_role = False
-            member_role = None
-            
-            for role_id in self.tracked_role_ids:
-                role = discord.utils.get(member.roles, id=role_id)
-                if role:
-                    has_tracked_role = True
-                    member_role = role
-                    break
-            
-            if not has_tracked_role or not member_role:
+        
+        done = asyncio.get_running_loop().create_future()
+        self.status_checks[member.id] = done
+        try:
+            await self.evaluate_member_status(member, channel, received_at)
+        finally:
+            if self.status_checks.get(member.id) is done:
+                del self.status_checks[member.id]
+            done.set_result(None)
+    
+    async def evaluate_member_status(self, member, channel, received_at=None):
+        """Decide and act on a member's status - only called via check_member_status"""
+        started_at = time.monotonic()
+        try:
+            # Only members in the tracked index (bots are never indexed)
+            member_role_id = self.tracked_members.get(member.id)
+            if not member_role_id:
                 return
             
             # Get current status
@@ -120,21 +788,38 @@ class OnlineAnnounce:
             if current_status != discord.Status.offline:
                 # Member is online - check if we need to announce
                 if member_id not in self.online_members:
-                    # This is a new online status
-                    await self.announce_online(member, member_role, channel)
-                    self.online_members.add(member_id)
+                    # This is a new online status - always goes into the local ledger
+                    self.record_attendance(member_id, datetime.now())
+                    
+                    if self.announce_mode == "board":
+                        self.mark_online(member_id)
+                    elif self.announce_mode == "daily":
+                        if self.claim_daily_announcement(member_id):
+                            self.mark_online(member_id, announced=True)
+                            await self.announce_online(member, member_role_id, channel, received_at, started_at)
+                        else:
+                            # Already announced today
+                            self.mark_online(member_id)
+                    elif self.should_announce(member_id):
+                        # Claim the member before yielding so no other caller can also announce them
+                        self.mark_online(member_id, announced=True)
+                        if self.announce_mode != "silent":
+                            await self.announce_online(member, member_role_id, channel, received_at, started_at)
+                    else:
+                        # Flapping or still in cooldown - track silently
+                        self.mark_online(member_id)
             else:
                 # Member is offline - remove from tracking
-                if member_id in self.online_members:
-                    self.online_members.remove(member_id)
+                self.mark_offline(member_id)
                     
         except Exception as e:
             logger.error(f"❌ Error checking member {member.name}: {e}")
+            presence_metrics.increment("errored")
+            self.drift_candidates.add(member.id)
     
-    async def announce_online(self, member, role, channel):
+    async def announce_online(self, member, role_id, channel, received_at=None, started_at=None):
         """Announce a member coming online"""
         try:
-            role_id = role.id
             role_config = self.role_config.get(role_id)
             
             if not role_config:
@@ -156,19 +841,236 @@ class OnlineAnnounce:
             # Add member avatar
             embed.set_thumbnail(url=member.display_avatar.url)
             
-            # Send announcement
-            await channel.send(embed=embed)
+            # Queue announcement in the role's priority lane of the role's channel
+            channel = self.get_role_channel(role_id, channel)
+            self.get_send_queue(channel).put(self.role_lanes[role_id], embed, member.mention, received_at)
+            if started_at is not None:
+                presence_metrics.record("process", time.monotonic() - started_at)
             
             logger.info(f"📢 Announced {member.display_name} ({role_name}) online")
             
         except Exception as e:
             logger.error(f"❌ Error announcing {member.display_name}: {e}")
+            presence_metrics.increment("errored")
     
-    async def on_presence_update(self, before, after):
-        """Handle presence updates in real-time"""
-        if not self.initialized:
+    def get_role_channel(self, role_id, default):
+        """Channel a role announces in - its own "channel_id" if configured, else the attendance channel"""
+        channel_id = self.role_config[role_id].get("channel_id")
+        if not channel_id:
+            return default
+        
+        channel = self.guild.get_channel(channel_id)
+        if not channel:
+            if channel_id not in self.missing_role_channels:
+                self.missing_role_channels.add(channel_id)
+                logger.warning(f"⚠️ Announcement channel {channel_id} for {self.role_config[role_id]['name']} not found - using the attendance channel")
+            return default
+        return channel
+    
+    def get_send_queue(self, channel):
+        """Get the announcement queue for the channel"""
+        send_queue = self.send_queues.get(channel.id)
+        if not send_queue:
+            send_queue = AnnouncementQueue(
+                channel,
+                [self.role_config[role_id]["name"] for role_id in self.lane_role_ids],
+                config.ANNOUNCE_COALESCE_SECONDS,
+                config.ANNOUNCE_MAX_EMBEDS,
+                config.ANNOUNCE_BACKPRESSURE_DEPTH,
+                config.ANNOUNCE_PROTECTED_LANES,
+                self.create_webhook_pool(channel)
+            )
+            self.send_queues[channel.id] = send_queue
+        # The channel object is replaced after a fresh READY
+        send_queue.channel = channel
+        if send_queue.webhook_pool:
+            send_queue.webhook_pool.channel = channel
+        return send_queue
+    
+    def create_webhook_pool(self, channel):
+        """Webhook sender for the channel, or None when announcements go through the bot account"""
+        if config.ANNOUNCE_WEBHOOK_POOL_SIZE <= 0:
+            return None
+        
+        me = self.guild.me
+        return WebhookPool(
+            channel,
+            config.ANNOUNCE_WEBHOOK_POOL_SIZE,
+            config.ANNOUNCE_WEBHOOK_NAME,
+            username=me.display_name if me else None,
+            avatar_url=me.display_avatar.url if me else None
+        )
+    
+    def render_board(self):
+        """Render the who's-online board grouped by role_config roles"""
+        online_by_role = {role_id: [] for role_id in self.tracked_role_ids}
+        for member_id in self.online_members:
+            role_id = self.tracked_members.get(member_id)
+            if role_id:
+                online_by_role[role_id].append(member_id)
+        
+        sections = []
+        for role_id, member_ids in online_by_role.items():
+            if not member_ids:
+                continue
+            mentions = ", ".join(f"<@{member_id}>" for member_id in sorted(member_ids))
+            sections.append(f"**{self.role_config[role_id]['name']}** ({len(member_ids)})\n{mentions}")
+        
+        content = "\n\n".join(sections) if sections else "Nobody is online right now."
+        
+        # Embed descriptions are limited to 4096 characters
+        if len(content) > 4096:
+            content = content[:4000].rsplit(",", 1)[0] + " …"
+        return content
+    
+    async def get_board_message(self, channel):
+        """Get the board message, reusing the saved one or posting and pinning a new one"""
+        if self.board_message and self.board_message.channel.id == channel.id:
+            return self.board_message
+        
+        saved = self.state.get_announce_board()
+        if saved.get('channel_id') == channel.id and saved.get('message_id'):
+            try:
+                self.board_message = await channel.fetch_message(saved['message_id'])
+                return self.board_message
+            except discord.NotFound:
+                logger.info("📌 Saved board message is gone - posting a new one")
+        
+        self.board_message = await channel.send(
+            embed=discord.Embed(title="🟢 Who's Online", color=discord.Color.green())
+        )
+        try:
+            await self.board_message.pin()
+        except discord.HTTPException as e:
+            logger.warning(f"⚠️ Could not pin board message: {e}")
+        
+        self.state.set_announce_board(channel.id, self.board_message.id)
+        self.last_board_content = None
+        return self.board_message
+    
+    @tasks.loop(seconds=60)
+    async def update_board(self):
+        """Edit the board message if the online list changed since the last edit"""
+        if not self.initialized or not self.board_dirty:
             return
+        
+        try:
+            channel = self.guild.get_channel(self.announce_channel_id)
+            if not channel:
+                return
+            
+            self.board_dirty = False
+            content = self.render_board()
+            if content == self.last_board_content:
+                return
             
+            message = await self.get_board_message(channel)
+            embed = discord.Embed(
+                title="🟢 Who's Online",
+                description=content,
+                color=discord.Color.green(),
+                timestamp=datetime.now()
+            )
+            embed.set_footer(text=f"{len(self.online_members)} tracked members online")
+            await message.edit(embed=embed)
+            self.last_board_content = content
+            
+        except discord.NotFound:
+            # Board message was deleted - post a new one next time
+            self.board_message = None
+            self.board_dirty = True
+        except Exception as e:
+            logger.error(f"❌ Error updating online board: {e}")
+            self.board_dirty = True
+    
+    def accept_presence(self, before, after):
+        """Dispatch-time filter - drop presence events we would ignore anyway.
+        
+        Runs for every presence event in the guild (activity changes included),
+        so it only does attribute compares and one dict lookup.
+        """
+        if before.status == after.status:
+            self.presence_filter_stats["unchanged"] += 1
+            presence_metrics.increment("dropped")
+            return False
+        
+        if after.id not in self.tracked_members or not after.guild or after.guild.id != self.guild.id:
+            self.presence_filter_stats["untracked"] += 1
+            presence_metrics.increment("dropped")
+            return False
+        
+        self.presence_filter_stats["accepted"] += 1
+        presence_metrics.increment("received")
+        self.event_received_at[after.id] = time.monotonic()
+        return True
+    
+    def render_attendance_digest(self, arrivals):
+        """Render arrivals as digest sections grouped by role, in lane order"""
+        by_role = {}
+        for member_id in sorted(arrivals):
+            by_role.setdefault(self.tracked_members.get(member_id), []).append(f"<@{member_id}>")
+        
+        sections = []
+        for role_id in self.lane_role_ids + [None]:
+            mentions = by_role.get(role_id)
+            if not mentions:
+                continue
+            role_name = self.role_config[role_id]["name"] if role_id else "Other"
+            sections.append((f"**{role_name}** ({len(mentions)})", mentions))
+        return sections
+    
+    @tasks.loop(hours=1)
+    async def post_attendance_digest(self):
+        """Silent mode - post who showed up since the last digest"""
+        try:
+            channel = self.guild.get_channel(self.announce_channel_id)
+            if not channel:
+                return
+            
+            now = datetime.now()
+            since = self.state.get_last_attendance_digest() or now - timedelta(hours=config.ATTENDANCE_DIGEST_HOURS)
+            arrivals = self.state.get_attendance_since(since)
+            
+            if arrivals:
+                # Split into embeds that stay well inside the description limit
+                descriptions = []
+                current = ""
+                for header, mentions in self.render_attendance_digest(arrivals):
+                    lines = [header]
+                    line = ""
+                    for mention in mentions:
+                        if len(line) + len(mention) > 1000:
+                            lines.append(line)
+                            line = ""
+                        line = f"{line}, {mention}" if line else mention
+                    lines.append(line)
+                    
+                    for text in lines:
+                        if len(current) + len(text) > 3800:
+                            descriptions.append(current)
+                            current = ""
+                        current = f"{current}\n{text}" if current else text
+                descriptions.append(current)
+                
+                for index, description in enumerate(descriptions):
+                    embed = discord.Embed(
+                        title="📋 Attendance Digest" + (f" ({index + 1}/{len(descriptions)})" if len(descriptions) > 1 else ""),
+                        description=description,
+                        color=discord.Color.green(),
+                        timestamp=now
+                    )
+                    embed.set_footer(text=f"{len(arrivals)} members online since {since.strftime('%Y-%m-%d %H:%M')}")
+                    await channel.send(embed=embed)
+                
+                logger.info(f"📋 Posted attendance digest: {len(arrivals)} members in {len(descriptions)} message(s)")
+            
+            self.state.set_last_attendance_digest(now)
+            
+        except Exception as e:
+            logger.error(f"❌ Error posting attendance digest: {e}")
+    
+    async def on_presence_update(self, before, after):
+        """Handle presence updates in real-time"""
         try:
             # Skip if not in our guild
             if not after.guild or after.guild.id != self.guild.id:
@@ -178,23 +1080,116 @@ class OnlineAnnounce:
             if after.bot:
                 return
             
-            channel = self.guild.get_channel(self.announce_channel_id)
-            if not channel:
+            # Check for status change
+            if before.status == after.status:
                 return
             
-            # Check for status change
-            if before.status != after.status:
-                await self.check_member_status(after, channel)
+            # Skip members without a tracked role
+            if after.id not in self.tracked_members:
+                return
+            
+            self.handle_status_change(after, before.status, after.status)
                 
         except Exception as e:
             logger.error(f"❌ Error in on_presence_update: {e}")
     
+    def handle_status_change(self, member, old_status, new_status):
+        """Journal and snapshot a tracked member's status transition, then queue its check"""
+        received_at = self.event_received_at.pop(member.id, None)
+        
+        self.journal.record(member.id, old_status, new_status)
+        self.status_snapshot[member.id] = str(new_status)
+        
+        if not self.presence_queue.put(member, received_at):
+            # Queue full - the reconciliation pass checks this member instead
+            self.drift_candidates.add(member.id)
+    
+    def start_presence_workers(self):
+        """Start the workers that drain the presence queue"""
+        self.presence_workers = [task for task in self.presence_workers if not task.done()]
+        while len(self.presence_workers) < config.PRESENCE_WORKERS:
+            self.presence_workers.append(asyncio.create_task(self.presence_worker()))
+    
+    async def presence_worker(self):
+        """Check queued members one at a time"""
+        while True:
+            member, received_at = await self.presence_queue.get()
+            try:
+                await self.process_status_change(member, received_at)
+            except Exception as e:
+                logger.error(f"❌ Error processing presence change for {member.name}: {e}")
+            self.presence_queue.stats["processed"] += 1
+            # Give the gateway a turn between members during bursts
+            await asyncio.sleep(0)
+    
+    async def process_status_change(self, member, received_at=None):
+        """Act on a queued member's current status"""
+        if received_at is not None:
+            presence_metrics.record("dispatch", time.monotonic() - received_at)
+        
+        if not self.initialized:
+            # Let the reconciliation pass pick this member up later
+            self.drift_candidates.add(member.id)
+            return
+        
+        channel = self.guild.get_channel(self.announce_channel_id)
+        if not channel:
+            self.drift_candidates.add(member.id)
+            return
+        
+        await self.check_member_status(member, channel, received_at)
+    
+    async def resync_after_reconnect(self, guild=None):
+        """Catch up on presence changes missed while the gateway was disconnected.
+        
+        Pass the new guild after a fresh READY (the cache was rebuilt, so the
+        role index is rebuilt too). Only members whose live status differs from
+        the snapshot produce a (synthetic) transition.
+        """
+        try:
+            if guild:
+                self.guild = guild
+                self.build_member_index()
+                
+                # Members who lost their tracked role while we were away
+                for member_id in list(self.status_snapshot):
+                    if member_id not in self.tracked_members:
+                        del self.status_snapshot[member_id]
+                        self.mark_offline(member_id)
+            
+            drifted = 0
+            for member_id in list(self.tracked_members):
+                member = self.guild.get_member(member_id)
+                if not member:
+                    continue
+                
+                old_status = self.status_snapshot.get(member_id, str(discord.Status.offline))
+                if old_status != str(member.status):
+                    drifted += 1
+                    self.handle_status_change(member, old_status, member.status)
+            
+            logger.info(f"🔁 Presence resync after reconnect: {drifted} members drifted")
+            
+        except Exception as e:
+            logger.error(f"❌ Error resyncing presence after reconnect: {e}")
+    
     @presence_check.before_loop
     async def before_presence_check(self):
         """Wait until bot is ready"""
         await self.bot.wait_until_ready()
     
-    @init_delayed.before_loop
-    async def before_init_delayed(self):
+    @flush_online_time.before_loop
+    async def before_flush_online_time(self):
         """Wait until bot is ready"""
         await self.bot.wait_until_ready()
+    
+    @post_attendance_digest.before_loop
+    async def before_post_attendance_digest(self):
+        """Wait until bot is ready"""
+        await self.bot.wait_until_ready()
+    
+    @update_board.before_loop
+    async def before_update_board(self):
+        """Wait until bot is ready"""
+        await self.bot.wait_until_ready()
+    
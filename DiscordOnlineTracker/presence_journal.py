@@ -0,0 +1,106 @@
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+class PresenceJournal:
+    """Append-only, day-rotated journal of presence transitions.
+    
+    Each line is "<timestamp> <member_id> <old_status> <new_status>" and
+    lives in presence-YYYY-MM-DD.log for the (local) day of its timestamp.
+    """
+    
+    def __init__(self, directory="presence_journal", flush_size=200):
+        self.directory = directory
+        self.flush_size = flush_size
+        self.buffer = []  # [(timestamp, member_id, old_status, new_status)]
+        
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def file_for_day(self, day):
+        """Get the journal file path for a date"""
+        return os.path.join(self.directory, f"presence-{day.isoformat()}.log")
+    
+    def record(self, member_id, old_status, new_status, timestamp=None):
+        """Buffer a transition - written out once flush_size entries are waiting"""
+        self.buffer.append((timestamp or time.time(), member_id, str(old_status), str(new_status)))
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+    
+    def flush(self):
+        """Write all buffered entries, one append per day file"""
+        if not self.buffer:
+            return 0
+        
+        entries, self.buffer = self.buffer, []
+        by_day = {}
+        for entry in entries:
+            day = datetime.fromtimestamp(entry[0]).date()
+            by_day.setdefault(day, []).append(entry)
+        
+        written = 0
+        for day, day_entries in by_day.items():
+            lines = "".join(
+                f"{timestamp:.3f} {member_id} {old_status} {new_status}\n"
+                for timestamp, member_id, old_status, new_status in day_entries
+            )
+            try:
+                with open(self.file_for_day(day), 'a') as f:
+                    f.write(lines)
+                written += len(day_entries)
+            except Exception as e:
+                logger.error(f"❌ Error writing presence journal for {day}: {e}")
+        
+        logger.debug(f"📓 Flushed {written} presence journal entries")
+        return written
+    
+    def prune(self, oldest_day):
+        """Delete day files older than the given date"""
+        removed = 0
+        cutoff = self.file_for_day(oldest_day)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith("presence-") and name.endswith(".log") and path < cutoff:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except Exception as e:
+                    logger.error(f"❌ Error removing presence journal {name}: {e}")
+        
+        if removed:
+            logger.info(f"🧹 Removed {removed} old presence journal files")
+        return removed
+    
+    def iter_entries(self, start, end=None, member_id=None):
+        """Stream (timestamp, member_id, old_status, new_status) between two datetimes.
+        
+        Files are read line by line, so large date ranges never load a whole
+        file into memory. Entries still in the buffer are not included.
+        """
+        start_ts = start.timestamp()
+        end_ts = end.timestamp() if end else float('inf')
+        last_day = (end or datetime.now()).date()
+        
+        day = start.date()
+        while day <= last_day:
+            path = self.file_for_day(day)
+            day += timedelta(days=1)
+            if not os.path.exists(path):
+                continue
+            
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        timestamp, entry_member_id, old_status, new_status = line.split()
+                        timestamp = float(timestamp)
+                        entry_member_id = int(entry_member_id)
+                    except ValueError:
+                        continue  # Partially written line
+                    
+                    if timestamp < start_ts or timestamp > end_ts:
+                        continue
+                    if member_id is not None and entry_member_id != member_id:
+                        continue
+                    yield timestamp, entry_member_id, old_status, new_status
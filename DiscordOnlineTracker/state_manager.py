@@ -1,5 +1,6 @@
 import json
 import asyncio
+import copy
 import threading
 from datetime import datetime, timedelta
 import os
@@ -7,11 +8,20 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+ACTIVITY_DAY_BITS = 64  # Days of per-member activity kept in the ledger bitmask
+MEMBER_SECTIONS = ('online_tracking', 'attendance_ledger')  # {user_id: flat dict} - snapshotted one level deep
+
 class StateManager:
     def __init__(self, data_file="state_data.json"):
         self.data_file = data_file
         self.lock = threading.Lock()
         
+        # Daily online-time rollups live in one file per day next to the state file,
+        # so a save only rewrites the days that changed (normally just today)
+        self.rollup_dir = os.path.join(os.path.dirname(os.path.abspath(data_file)), "online_rollups")
+        self.online_rollups = {}          # {date: {user_id: seconds_online}}
+        self.dirty_rollup_days = set()    # Dates changed since the last save
+        
         # Initialize state data
         self.state = {
             'active_interviews': {},      # {user_id: interview_data}
@@ -20,11 +30,18 @@ class StateManager:
             'interview_timeouts': {},     # {user_id: timeout_data}
             'recent_joins': {},           # {user_id: join_time} - IN-MEMORY ONLY
             'online_tracking': {},        # {user_id: tracking_data}
+            'announce_board': {},         # {channel_id, message_id} of the who's-online board
+            'attendance_ledger': {},      # {user_id: {first_seen, last_seen, last_day, days, streak, best_streak}}
+            'attendance_digest': {},      # {last_posted}
+            'daily_announced': {},        # {day, members: [user_id]} - daily announce mode
+            'demotions': {},              # {user_id: date they got the Inactive role (or were first seen with it)}
+            'attendance_history': {},     # {cursor: last attendance message id read into the ledger, backfilled}
             'cleanup_check_dates': {},    # {user_id: last_check_date}
             'last_save': None
         }
         
         # Load existing state
+        self.load_rollups()
         self.load_state()
     
     def load_state(self):
@@ -35,6 +52,12 @@ class StateManager:
                     with open(self.data_file, 'r') as f:
                         loaded_state = json.load(f)
                         
+                        # Rollups saved inside the state file by older versions
+                        for day, rollup in loaded_state.get('online_rollups', {}).items():
+                            if day not in self.online_rollups:
+                                self.online_rollups[day] = rollup
+                                self.dirty_rollup_days.add(day)
+                        
                         # Merge loaded state with default structure
                         for key in self.state:
                             if key in loaded_state:
@@ -49,40 +72,107 @@ class StateManager:
             logger.error(f"❌ Error loading state: {e}")
             # Keep default state on error
     
+    def load_rollups(self):
+        """Load the daily online-time rollup files"""
+        os.makedirs(self.rollup_dir, exist_ok=True)
+        for name in os.listdir(self.rollup_dir):
+            if not (name.startswith("rollup-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.rollup_dir, name), 'r') as f:
+                    self.online_rollups[name[len("rollup-"):-len(".json")]] = json.load(f)
+            except Exception as e:
+                logger.error(f"❌ Error loading online rollup {name}: {e}")
+    
+    def rollup_file(self, day):
+        """Get the rollup file path for a date string"""
+        return os.path.join(self.rollup_dir, f"rollup-{day}.json")
+    
+    def snapshot_state(self):
+        """Copy the state for saving - WITHOUT recent_joins.
+        
+        Must run on the thread that changes state (the event loop). Only
+        copies: serializing happens in write_snapshot, off the loop. The
+        per-member sections hold flat dicts, so one level of copying is a
+        consistent snapshot; the small sections are deep-copied.
+        """
+        state_copy = {}
+        for key, value in self.state.items():
+            if key == 'recent_joins':
+                continue  # Remove recent_joins - don't save to file
+            if key in MEMBER_SECTIONS:
+                state_copy[key] = {user_id: dict(entry) for user_id, entry in value.items()}
+            else:
+                state_copy[key] = copy.deepcopy(value)
+        state_copy['last_save'] = datetime.now().isoformat()
+        
+        rollups = {day: dict(self.online_rollups[day]) for day in self.dirty_rollup_days if day in self.online_rollups}
+        self.dirty_rollup_days.clear()
+        return state_copy, rollups
+    
+    async def snapshot_state_async(self):
+        """snapshot_state, scheduled onto the event loop from the auto-save thread"""
+        return self.snapshot_state()
+    
+    def write_snapshot(self, snapshot):
+        """Serialize and write a snapshot atomically - a crash mid-write never truncates a file"""
+        state_copy, rollups = snapshot
+        # Try to acquire lock with timeout to prevent deadlock
+        if not self.lock.acquire(timeout=1.0):  # 1 second timeout
+            logger.warning("⏰ Could not acquire lock for save_state - skipping save")
+            self.dirty_rollup_days.update(rollups)
+            return
+        try:
+            for day, rollup in rollups.items():
+                self.write_file(self.rollup_file(day), json.dumps(rollup))
+            self.write_file(self.data_file, json.dumps(state_copy, default=str))
+            logger.debug(f"💾 Saved state to {self.data_file}")
+        except Exception as e:
+            logger.error(f"❌ Error saving state: {e}")
+            self.dirty_rollup_days.update(rollups)
+        finally:
+            self.lock.release()
+    
+    def write_file(self, path, data):
+        """Replace a file through a synced temp file"""
+        temp_file = f"{path}.tmp"
+        with open(temp_file, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    
     def save_state(self):
-        """Save state to file - WITHOUT recent_joins"""
+        """Save state to file - call from the event loop thread"""
         try:
-            # Create a copy of state WITHOUT recent_joins
-            state_copy = self.state.copy()
-            state_copy.pop('recent_joins', None)  # Remove recent_joins - don't save to file
-            state_copy['last_save'] = datetime.now().isoformat()
-            
-            # Try to acquire lock with timeout to prevent deadlock
-            if self.lock.acquire(timeout=1.0):  # 1 second timeout
-                try:
-                    with open(self.data_file, 'w') as f:
-                        json.dump(state_copy, f, indent=2, default=str)
-                    logger.debug(f"💾 Saved state to {self.data_file}")
-                except Exception as e:
-                    logger.error(f"❌ Error saving state: {e}")
-                finally:
-                    self.lock.release()
-            else:
-                logger.warning("⏰ Could not acquire lock for save_state - skipping save")
+            self.write_snapshot(self.snapshot_state())
         except Exception as e:
             logger.error(f"❌ Error in save_state: {e}")
     
     def start_auto_save(self):
-        """Start automatic saving every 5 minutes - SIMPLIFIED VERSION"""
+        """Start automatic saving every 5 minutes - SIMPLIFIED VERSION
+        
+        Call from the event loop: the snapshot is taken on the loop and only
+        the file write happens in the background thread.
+        """
         import threading
         import time
         
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        
         def auto_save_loop():
             """Background thread for auto-saving"""
             while True:
                 try:
                     time.sleep(300)  # 5 minutes = 300 seconds
-                    self.save_state()
+                    if loop and loop.is_running():
+                        data = asyncio.run_coroutine_threadsafe(self.snapshot_state_async(), loop).result(timeout=60)
+                        self.write_snapshot(data)
+                    else:
+                        self.save_state()
                 except Exception as e:
                     logger.error(f"Auto-save error: {e}")
                     time.sleep(60)  # Wait 1 minute on error
@@ -197,6 +287,182 @@ class StateManager:
         """Get all tracked users"""
         return list(self.state['online_tracking'].keys())
     
+    # ======== ANNOUNCE BOARD ========
+    
+    def get_announce_board(self):
+        """Get the saved who's-online board message location"""
+        return self.state['announce_board']
+    
+    def set_announce_board(self, channel_id, message_id):
+        """Save the who's-online board message location"""
+        self.state['announce_board'] = {'channel_id': channel_id, 'message_id': message_id}
+    
+    # ======== ONLINE TIME ROLLUPS ========
+    
+    def add_online_seconds(self, day, user_id, seconds):
+        """Add online seconds to a member's rollup for a date"""
+        rollup = self.online_rollups.setdefault(day.isoformat(), {})
+        self.dirty_rollup_days.add(day.isoformat())
+        user_id_str = str(user_id)
+        rollup[user_id_str] = rollup.get(user_id_str, 0) + seconds
+    
+    def get_online_seconds(self, day, user_id):
+        """Get a member's online seconds for a date"""
+        return self.online_rollups.get(day.isoformat(), {}).get(str(user_id), 0)
+    
+    def prune_online_rollups(self, oldest_day):
+        """Remove rollups older than the given date"""
+        cutoff = oldest_day.isoformat()
+        old_days = [day for day in self.online_rollups if day < cutoff]
+        for day in old_days:
+            del self.online_rollups[day]
+            self.dirty_rollup_days.discard(day)
+            try:
+                if os.path.exists(self.rollup_file(day)):
+                    os.remove(self.rollup_file(day))
+            except Exception as e:
+                logger.error(f"❌ Error removing online rollup for {day}: {e}")
+        return len(old_days)
+    
+    # ======== ATTENDANCE LEDGER ========
+    
+    def record_attendance(self, user_id, seen_at):
+        """Record that a member came online"""
+        entry = self.state['attendance_ledger'].setdefault(str(user_id), {})
+        seen_at_str = seen_at.isoformat()
+        if not entry.get('first_seen') or seen_at_str < entry['first_seen']:
+            entry['first_seen'] = seen_at_str
+        if not entry.get('last_seen') or seen_at_str > entry['last_seen']:
+            entry['last_seen'] = seen_at_str
+        self.record_active_day(entry, seen_at.date())
+    
+    def record_active_day(self, entry, day):
+        """Update a ledger entry's daily activity bitmask and streaks.
+        
+        Bit 0 of 'days' is 'last_day', bit i is i days before it. The current
+        streak is kept as a counter so it can outgrow the bitmask.
+        """
+        last_day = entry.get('last_day')
+        if not last_day:
+            entry.update(last_day=day.isoformat(), days=1, streak=1, best_streak=1)
+            return
+        
+        gap = (day - datetime.fromisoformat(last_day).date()).days
+        if gap > 0:
+            entry['last_day'] = day.isoformat()
+            entry['days'] = ((entry['days'] << gap) | 1) & ((1 << ACTIVITY_DAY_BITS) - 1)
+            entry['streak'] = entry['streak'] + 1 if gap == 1 else 1
+        elif -gap < ACTIVITY_DAY_BITS and not entry['days'] >> -gap & 1:
+            # An older day arriving late (history backfill) - may join up the current streak
+            entry['days'] |= 1 << -gap
+            run = (~entry['days'] & (entry['days'] + 1)).bit_length() - 1
+            entry['streak'] = max(entry['streak'], run)
+        entry['best_streak'] = max(entry.get('best_streak', 0), entry['streak'])
+    
+    def get_attendance_stats(self, user_id, today, window=30):
+        """Get {streak, best_streak, active_days} for a member as of today.
+        
+        A streak survives until the end of the day after the last active day;
+        active_days counts days online in the last `window` days (max 64).
+        """
+        entry = self.state['attendance_ledger'].get(str(user_id))
+        if not entry or not entry.get('last_day'):
+            return {'streak': 0, 'best_streak': 0, 'active_days': 0}
+        
+        age = (today - datetime.fromisoformat(entry['last_day']).date()).days
+        visible = max(0, min(window, ACTIVITY_DAY_BITS) - max(age, 0))
+        return {
+            'streak': entry['streak'] if age <= 1 else 0,
+            'best_streak': entry['best_streak'],
+            'active_days': bin(entry['days'] & ((1 << visible) - 1)).count('1'),
+        }
+    
+    def get_last_attendance(self, user_id):
+        """Get the last time a member came online"""
+        entry = self.state['attendance_ledger'].get(str(user_id))
+        if entry and entry.get('last_seen'):
+            try:
+                return datetime.fromisoformat(entry['last_seen'])
+            except:
+                return None
+        return None
+    
+    def get_attendance_since(self, since):
+        """Get {user_id: last_seen} for members seen at or after a date"""
+        since_str = since.isoformat()
+        return {
+            int(user_id_str): datetime.fromisoformat(entry['last_seen'])
+            for user_id_str, entry in self.state['attendance_ledger'].items()
+            if entry.get('last_seen') and entry['last_seen'] >= since_str
+        }
+    
+    def get_last_attendance_digest(self):
+        """Get when the last attendance digest was posted"""
+        last_posted = self.state['attendance_digest'].get('last_posted')
+        if last_posted:
+            try:
+                return datetime.fromisoformat(last_posted)
+            except:
+                return None
+        return None
+    
+    def set_last_attendance_digest(self, posted_at):
+        """Set when the last attendance digest was posted"""
+        self.state['attendance_digest']['last_posted'] = posted_at.isoformat()
+    
+    def get_attendance_cursor(self):
+        """Get the id of the last attendance channel message read into the ledger"""
+        return self.state['attendance_history'].get('cursor')
+    
+    def set_attendance_cursor(self, message_id):
+        """Set the id of the last attendance channel message read into the ledger"""
+        self.state['attendance_history']['cursor'] = message_id
+    
+    def is_attendance_backfilled(self):
+        """Check whether the attendance channel history has been read into the ledger"""
+        return bool(self.state['attendance_history'].get('backfilled'))
+    
+    def set_attendance_backfilled(self):
+        """Mark the one-time attendance history backfill as complete"""
+        self.state['attendance_history']['backfilled'] = True
+    
+    # ======== DAILY ANNOUNCEMENTS ========
+    
+    def get_daily_announced(self, day):
+        """Get the set of members already announced on a day"""
+        daily = self.state['daily_announced']
+        if daily.get('day') != day.isoformat():
+            return set()
+        return set(daily.get('members', []))
+    
+    def add_daily_announced(self, day, user_id):
+        """Record a member as announced on a day - a new day starts an empty set"""
+        daily = self.state['daily_announced']
+        if daily.get('day') != day.isoformat():
+            daily.clear()
+            daily.update(day=day.isoformat(), members=[])
+        daily['members'].append(user_id)
+    
+    # ======== DEMOTIONS ========
+    
+    def get_demotion_date(self, user_id):
+        """Get when a member got the Inactive role"""
+        demoted_at = self.state['demotions'].get(str(user_id))
+        if demoted_at:
+            try:
+                return datetime.fromisoformat(demoted_at)
+            except:
+                return None
+        return None
+    
+    def set_demotion_date(self, user_id, demoted_at):
+        """Set when a member got the Inactive role - None caches an unknown date"""
+        self.state['demotions'][str(user_id)] = demoted_at.isoformat() if demoted_at else None
+    
+    def clear_demotion_date(self, user_id):
+        """Forget a member's demotion (they left the Inactive role)"""
+        self.state['demotions'].pop(str(user_id), None)
+    
     # ======== CLEANUP CHECK DATES ========
     
     def get_cleanup_check_date(self, user_id):
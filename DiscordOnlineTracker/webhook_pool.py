@@ -0,0 +1,122 @@
+import discord
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class WebhookPool:
+    """Rotating pool of channel webhooks for sending announcements.
+    
+    Each webhook has its own rate-limit bucket, separate from the bot's
+    bucket for the channel. Every send goes to the webhook that is free
+    soonest, and each webhook is paced to its bucket locally so discord.py
+    never has to sleep on a 429. If a webhook send fails, that message goes
+    out through the bot account instead.
+    """
+    
+    def __init__(self, channel, size, name, rate=5, per=2.0, username=None, avatar_url=None):
+        self.channel = channel
+        self.size = size
+        self.name = name
+        self.rate = rate  # Sends allowed per webhook...
+        self.per = per    # ...in this many seconds
+        self.username = username
+        self.avatar_url = avatar_url
+        
+        self.webhooks = []
+        self.sent_at = {}  # {webhook_id: deque of monotonic send times (reserved slots included)}
+        self.blocked_until = {}  # {webhook_id: monotonic time the webhook may be used again}
+        self.next_setup = 0.0
+        self.setup_lock = asyncio.Lock()
+        self.stats = {"webhook": 0, "fallback": 0, "rate_limited": 0}
+    
+    async def setup(self):
+        """Find or create the pool's webhooks - retried every 5 minutes while the pool is short"""
+        if len(self.webhooks) >= self.size or time.monotonic() < self.next_setup:
+            return
+        
+        async with self.setup_lock:
+            if len(self.webhooks) >= self.size or time.monotonic() < self.next_setup:
+                return
+            self.next_setup = time.monotonic() + 300
+            
+            try:
+                known = {webhook.id for webhook in self.webhooks}
+                for webhook in await self.channel.webhooks():
+                    if len(self.webhooks) >= self.size:
+                        break
+                    if webhook.name == self.name and webhook.token and webhook.id not in known:
+                        self.webhooks.append(webhook)
+                
+                while len(self.webhooks) < self.size:
+                    self.webhooks.append(await self.channel.create_webhook(name=self.name, reason="Attendance announcements"))
+                
+                logger.info(f"🪝 Announcement webhook pool ready ({len(self.webhooks)} webhooks)")
+                
+            except Exception as e:
+                logger.error(f"❌ Error setting up announcement webhooks ({len(self.webhooks)}/{self.size} available): {e}")
+    
+    def free_at(self, webhook):
+        """Earliest monotonic time the webhook has room in its bucket"""
+        sent = self.sent_at.setdefault(webhook.id, deque())
+        now = time.monotonic()
+        while sent and sent[0] <= now - self.per:
+            sent.popleft()
+        
+        ready = self.blocked_until.get(webhook.id, 0.0)
+        if len(sent) >= self.rate:
+            ready = max(ready, sent[-self.rate] + self.per)
+        return ready
+    
+    async def acquire(self):
+        """Reserve a slot on the webhook that frees up first, waiting for it if needed"""
+        if not self.webhooks:
+            return None
+        
+        webhook = min(self.webhooks, key=self.free_at)
+        send_at = max(self.free_at(webhook), time.monotonic())
+        # Reserve before sleeping so concurrent senders pick another webhook
+        self.sent_at[webhook.id].append(send_at)
+        
+        wait = send_at - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return webhook
+    
+    def remove(self, webhook):
+        """Drop a webhook that no longer exists - setup() replaces it later"""
+        if webhook in self.webhooks:
+            self.webhooks.remove(webhook)
+        self.sent_at.pop(webhook.id, None)
+        self.blocked_until.pop(webhook.id, None)
+    
+    async def send(self, embeds):
+        """Send one message through the pool, falling back to the bot account"""
+        await self.setup()
+        
+        webhook = await self.acquire()
+        if webhook:
+            try:
+                await webhook.send(embeds=embeds, username=self.username, avatar_url=self.avatar_url)
+                self.stats["webhook"] += 1
+                return
+            except discord.NotFound:
+                logger.warning(f"⚠️ Announcement webhook {webhook.id} was deleted - removing it from the pool")
+                self.remove(webhook)
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    self.stats["rate_limited"] += 1
+                # Rest the webhook for a full bucket window
+                self.blocked_until[webhook.id] = time.monotonic() + self.per
+                logger.warning(f"⚠️ Announcement webhook {webhook.id} failed ({e.status}) - sending as the bot")
+            except Exception as e:
+                logger.warning(f"⚠️ Announcement webhook {webhook.id} failed ({e}) - sending as the bot")
+        
+        self.stats["fallback"] += 1
+        await self.channel.send(embeds=embeds)
+    
+    def get_metrics(self):
+        """Pool size and how messages were delivered"""
+        return {"webhooks": len(self.webhooks), "size": self.size, **self.stats}